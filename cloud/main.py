@@ -1,6 +1,7 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, status
+from fastapi import FastAPI, Depends, HTTPException, Request, UploadFile, File, Form, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import json
@@ -53,6 +54,49 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
 # Pi Device Endpoints
+def _store_security_event(device, event_type, confidence_score, detected_at,
+                          detected_objects, face_analysis, image, video, db):
+    """Upload event media, save the event and queue its analysis"""
+    # Generate unique event ID
+    event_id = str(uuid.uuid4())
+    
+    # Upload image to S3
+    image_key = f"events/{event_id}/image.jpg"
+    image_url = upload_to_s3(image.file, image_key, s3_client, settings.s3_bucket_name)
+    
+    # Upload video if provided
+    video_url = None
+    if video:
+        video_key = f"events/{event_id}/video.mp4"
+        video_url = upload_to_s3(video.file, video_key, s3_client, settings.s3_bucket_name)
+    
+    # Create security event
+    event = SecurityEvent(
+        event_id=event_id,
+        device_id=device.id,
+        event_type=event_type,
+        confidence_score=confidence_score,
+        image_url=image_url,
+        video_url=video_url,
+        detected_objects=detected_objects,
+        face_analysis=face_analysis,
+        detected_at=datetime.fromisoformat(detected_at.replace('Z', '+00:00')),
+    )
+    
+    db.add(event)
+    db.commit()
+    db.refresh(event)
+    
+    # Queue LLM analysis task
+    task = analyze_security_event.delay(event_id)
+    
+    return {
+        "event_id": event_id,
+        "status": "created",
+        "analysis_task_id": task.id,
+        "message": "Event created and queued for analysis"
+    }
+
 @app.post("/api/v1/events")
 async def create_security_event(
     event_type: str = Form(...),
@@ -73,50 +117,70 @@ async def create_security_event(
     if not device:
         raise HTTPException(status_code=401, detail="Invalid API key")
     
-    # Generate unique event ID
-    event_id = str(uuid.uuid4())
-    
     try:
-        # Upload image to S3
-        image_key = f"events/{event_id}/image.jpg"
-        image_url = upload_to_s3(image.file, image_key, s3_client, settings.s3_bucket_name)
-        
-        # Upload video if provided
-        video_url = None
-        if video:
-            video_key = f"events/{event_id}/video.mp4"
-            video_url = upload_to_s3(video.file, video_key, s3_client, settings.s3_bucket_name)
-        
-        # Create security event
-        event = SecurityEvent(
-            event_id=event_id,
-            device_id=device.id,
-            event_type=event_type,
-            confidence_score=confidence_score,
-            image_url=image_url,
-            video_url=video_url,
-            detected_objects=detected_objects,
-            face_analysis=face_analysis,
-            detected_at=datetime.fromisoformat(detected_at.replace('Z', '+00:00')),
+        return _store_security_event(
+            device, event_type, confidence_score, detected_at,
+            detected_objects, face_analysis, image, video, db
         )
-        
-        db.add(event)
-        db.commit()
-        db.refresh(event)
-        
-        # Queue LLM analysis task
-        task = analyze_security_event.delay(event_id)
-        
-        return {
-            "event_id": event_id,
-            "status": "created",
-            "analysis_task_id": task.id,
-            "message": "Event created and queued for analysis"
-        }
-        
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create event: {str(e)}")
 
+def _store_security_events_batch(device, form, count, db):
+    """Store each indexed event of a batch form, collecting per-index results"""
+    results = []
+    for index in range(count):
+        prefix = f"events[{index}]."
+        try:
+            image = form.get(prefix + "image")
+            if image is None:
+                raise ValueError("image is required")
+            result = _store_security_event(
+                device,
+                form[prefix + "event_type"],
+                float(form[prefix + "confidence_score"]),
+                form[prefix + "detected_at"],
+                form.get(prefix + "detected_objects", "[]"),
+                form.get(prefix + "face_analysis", "{}"),
+                image,
+                form.get(prefix + "video"),
+                db
+            )
+            results.append({"index": index, **result})
+        except Exception as e:
+            db.rollback()
+            results.append({"index": index, "status": "failed", "error": str(e)})
+    
+    return results
+
+@app.post("/api/v1/events/batch")
+async def create_security_events_batch(
+    request: Request,
+    device_credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
+    """
+    Create several security events from Pi device in one request
+    
+    Fields are indexed per event (events[0].event_type, events[0].image, ...).
+    Each event succeeds or fails on its own; failures are reported by index
+    so the device only retries those.
+    """
+    device = verify_api_key(device_credentials.credentials, db)
+    if not device:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    form = await request.form()
+    try:
+        count = int(form.get("count", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="count must be an integer")
+    if count <= 0 or count > 32:
+        raise HTTPException(status_code=400, detail="Batch must contain 1-32 events")
+    
+    # S3 uploads and DB commits block; keep them off the event loop
+    results = await run_in_threadpool(_store_security_events_batch, device, form, count, db)
+    return {"results": results}
+
 @app.get("/api/v1/devices/{device_id}/settings")
 async def get_device_settings(
     device_id: str,
@@ -2,6 +2,7 @@
 Camera utilities for PiCamera2
 """
 
+import io
 import time
 import threading
 import numpy as np
@@ -9,6 +10,7 @@ from datetime import datetime
 from picamera2 import Picamera2
 from picamera2.encoders import H264Encoder, MJPEGEncoder
 from config.settings import Settings
+from utils.helpers import file_timestamp
 
 class CameraManager:
     """Camera manager with dual capture capabilities"""
@@ -26,6 +28,7 @@ class CameraManager:
         self.low_res_config = Settings.get_low_res_config()
         self.video_settings = Settings.get_video_settings()
         self.file_paths = Settings.get_file_paths()
+        self.verbose = Settings.get_verbose()  # Per-capture progress output
 
     def setup(self):
         """Initialize camera"""
@@ -56,28 +59,54 @@ class CameraManager:
     
     def capture_high_res_snapshot(self, filename=None):
         """Capture high resolution snapshot"""
+        return self._capture_snapshot(filename)[0]
+    
+    def _capture_snapshot(self, filename=None):
+        """
+        Capture high resolution snapshot, keeping the in-memory copies
+        
+        Returns:
+            tuple: (filename, RGB frame, JPEG bytes), all None on failure
+        """
         if not self.is_initialized:
             print("Camera not initialized")
-            return None
+            return None, None, None
             
         try:
             # Generate filename if not provided
             if filename is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                timestamp = file_timestamp()
                 filename = f"{self.file_paths['snapshots']}snapshot_{timestamp}.jpg"
             
             # Switch to photo configuration
             self.picam2.switch_mode(self.photo_config)
             time.sleep(0.5)  # Let camera adjust
             
-            # Capture high-res photo
-            self.picam2.capture_file(filename)
-            print(f"High-res snapshot saved: {filename}")
-            return filename
+            # Capture high-res photo from a single request so the same buffer
+            # is both encoded to disk and kept in memory for analysis
+            request = self.picam2.capture_request()
+            try:
+                jpeg_buffer = io.BytesIO()
+                request.save("main", jpeg_buffer, format="jpeg")
+                frame = request.make_array("main")
+            finally:
+                request.release()
+            
+            jpeg_bytes = jpeg_buffer.getvalue()
+            with open(filename, 'wb') as f:
+                f.write(jpeg_bytes)
+            
+            # Picamera2 "RGB888" is BGR in memory; "BGR888" is already RGB
+            if self.high_res_config['format'] == 'RGB888':
+                frame = np.ascontiguousarray(frame[:, :, ::-1])
+            
+            if self.verbose:
+                print(f"High-res snapshot saved: {filename}")
+            return filename, frame, jpeg_bytes
             
         except Exception as e:
             print(f"Snapshot capture failed: {e}")
-            return None
+            return None, None, None
     
     def record_low_res_video(self, filename=None):
         """Record low resolution video for specified duration"""
@@ -88,7 +117,7 @@ class CameraManager:
         try:
             # Generate filename if not provided
             if filename is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                timestamp = file_timestamp()
                 filename = f"{self.file_paths['videos']}video_{timestamp}.{self.video_settings['format']}"
             
             # Switch to video configuration
@@ -105,14 +134,16 @@ class CameraManager:
             
             # Start recording
             self.picam2.start_recording(encoder, temp_filename)
-            print(f"Started recording video: {temp_filename}")
+            if self.verbose:
+                print(f"Started recording video: {temp_filename}")
             
             # Record for specified duration
             time.sleep(self.video_settings["duration"])
 
             # Stop recording
             self.picam2.stop_recording()
-            print(f"Video recording complete: {temp_filename}")
+            if self.verbose:
+                print(f"Video recording complete: {temp_filename}")
             
             # Convert H.264 to MP4 if needed
             if self.video_settings['format'].lower() == 'mp4' and temp_filename != filename:
@@ -127,7 +158,8 @@ class CameraManager:
                     
                     if result.returncode == 0:
                         os.remove(temp_filename)  # Remove temporary H.264 file
-                        print(f"Converted to MP4: {filename}")
+                        if self.verbose:
+                            print(f"Converted to MP4: {filename}")
                     else:
                         print(f"FFmpeg conversion failed: {result.stderr}")
                         # Keep the H.264 file and update filename
@@ -151,11 +183,12 @@ class CameraManager:
         """
         # SET CAMERA AS BUSY
         self.camera_busy.set()
-        print("Camera Thread: Motion triggered! Starting dual capture...")
+        if self.verbose:
+            print("Camera Thread: Motion triggered! Starting dual capture...")
         
         try:
             # Capture high-res snapshot first (quick)
-            snapshot_file = self.capture_high_res_snapshot()
+            snapshot_file, snapshot_rgb, snapshot_jpeg = self._capture_snapshot()
             
             # Record low-res video
             video_file = self.record_low_res_video()
@@ -163,14 +196,17 @@ class CameraManager:
             capture_info = {
                 'timestamp': datetime.now().isoformat(),
                 'snapshot': snapshot_file,
+                'snapshot_rgb': snapshot_rgb,  # Avoids re-decoding the JPEG
+                'snapshot_jpeg': snapshot_jpeg,  # Avoids re-reading the file for upload
                 'video': video_file,
                 'success': bool(snapshot_file and video_file)
             }
             
             if capture_info['success']:
-                print("Motion capture complete!")
-                print(f"   Snapshot: {snapshot_file}")
-                print(f"   Video: {video_file}")
+                if self.verbose:
+                    print("Motion capture complete!")
+                    print(f"   Snapshot: {snapshot_file}")
+                    print(f"   Video: {video_file}")
                 
                 # Trigger callback for motion event processing
                 if self.motion_callback:
@@ -191,7 +227,8 @@ class CameraManager:
         finally:
             # CLEAR CAMERA BUSY FLAG
             self.camera_busy.clear()
-            print("Camera Thread: Camera available again")
+            if self.verbose:
+                print("Camera Thread: Camera available again")
     
     def start_motion_monitoring(self, pir_sensor):
         """
@@ -206,7 +243,8 @@ class CameraManager:
                 try:
                     # WAIT FOR MOTION EVENT FROM PIR
                     if pir_sensor and pir_sensor.wait_for_motion(timeout=10):
-                        print("Camera Thread: Motion event received!")
+                        if self.verbose:
+                            print("Camera Thread: Motion event received!")
                         
                         # Check if camera is already busy
                         if self.camera_busy.is_set():
@@ -227,10 +265,9 @@ class CameraManager:
                         # Trigger dual capture in current thread to maintain control
                         self.motion_triggered_capture()
                         
-                    else:
-                        # Timeout - just continue monitoring
-                        time.sleep(0.1)  # Small delay to prevent excessive CPU usage
-                        continue
+                    elif not pir_sensor:
+                        # No sensor to block on - avoid spinning
+                        time.sleep(0.1)
                         
                 except Exception as e:
                     print(f"Motion monitoring error: {e}")
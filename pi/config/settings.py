@@ -3,14 +3,18 @@
 Configuration settings for the security camera system
 """
 
+from types import MappingProxyType
+
 # PIR Sensor Settings
-PIR_PIN = 11
+PIR_PIN = 11  # physical (BOARD) header pin
+PIR_GPIO_CHIP = "/dev/gpiochip0"  # GPIO character device for the 40-pin header (gpiochip4 on Pi 5 with older kernels)
+PIR_EDGE_DEBOUNCE_MS = 50  # kernel glitch filter: the line must hold a level this long before an edge is reported
 PIR_SENSITIVITY_DELAY = 2.0
 
 # Camera Settings - High Resolution (for snapshots)
 CAMERA_HIGH_RES_WIDTH = 1920
 CAMERA_HIGH_RES_HEIGHT = 1080
-CAMERA_HIGH_RES_FORMAT = "RGB888"
+CAMERA_HIGH_RES_FORMAT = "BGR888"  # Picamera2 BGR888 is RGB byte order in memory, as face_recognition expects
 
 # Camera Settings - Low Resolution (for video)
 CAMERA_LOW_RES_WIDTH = 640
@@ -26,18 +30,36 @@ VIDEO_FORMAT = "h264"  # Use H264 raw format for reliable encoding
 CAPTURES_DIR = "captures/"
 SNAPSHOTS_DIR = "captures/snapshots/"
 VIDEOS_DIR = "captures/videos/"
+FILE_PATHS = MappingProxyType({
+    "captures": CAPTURES_DIR,
+    "snapshots": SNAPSHOTS_DIR,
+    "videos": VIDEOS_DIR
+})
 
 # Face Recognition Settings
 FACE_EMBEDDINGS_FILE = "captures/known_faces/embeddings.json"
+FACE_EMBEDDINGS_CACHE_FILE = "captures/known_faces/embeddings.pkl"  # binary cache of the JSON above
 FACE_IMAGES_DIR = "captures/known_faces/images/"
+FACE_SAVE_REFERENCE_IMAGES = True  # keep a JPEG of each enrolled face (only the embedding is used for matching)
 FACE_METADATA_FILE = "captures/known_faces/metadata.json"
+FACE_MAX_EMBEDDINGS_PER_PERSON = 8  # closest enrolled embeddings are merged beyond this
+FACE_DETECTION_MAX_SIZE = 640  # longest side (pixels) of the frame used to locate faces
+FACE_DETECTION_UPSAMPLE = 1  # HOG detector upsampling passes; 0 is ~4x cheaper but misses faces under ~80px
 
 # Yolo Model Settings
 YOLO_MODEL = "yolo11n.pt"
+YOLO_IMAGE_SIZE = 640  # fixed input size used when exporting accelerated models
+YOLO_TENSORRT_FP16 = True  # export/load a TensorRT FP16 engine when a CUDA device is present
+YOLO_ONNX_CPU = True  # export/load an ONNX model for onnxruntime when there is no CUDA device (e.g. Pi)
+YOLO_ONNX_INT8 = False  # dynamically quantize the ONNX weights to int8 (check accuracy before enabling)
+YOLO_BATCH_SIZE = 4  # frames per YOLO call during video analysis
+PRELOAD_MODELS = True  # load + warm up models in the background at startup (False = load on first event)
+VERBOSE = True  # per-event progress output; False keeps only warnings, alerts and errors
 
 # Behavior Analysis Settings - Video-based Dwelling Detection
 DWELLING_THRESHOLD = 30  # seconds - minimum time to consider dwelling
 VIDEO_FRAME_SKIP = 3  # analyze every nth frame for efficiency
+VIDEO_HW_DECODE = False  # decode .h264 clips with the V4L2 hardware decoder via GStreamer (Pi 4; the Pi 5 has no H.264 decoder)
 MIN_PERSON_CONFIDENCE = 0.5  # minimum YOLO confidence for person detection
 
 # Cloud Communication Settings
@@ -53,6 +75,16 @@ class Settings:
     def get_pir_pin():
         return PIR_PIN
     
+    @staticmethod
+    def get_pir_gpio_chip():
+        """Get GPIO character device the PIR pin is on"""
+        return PIR_GPIO_CHIP
+    
+    @staticmethod
+    def get_pir_edge_debounce_ms():
+        """Get kernel debounce period (milliseconds) for PIR edge events"""
+        return PIR_EDGE_DEBOUNCE_MS
+    
     @staticmethod
     def get_high_res_config():
         return {
@@ -77,31 +109,79 @@ class Settings:
     
     @staticmethod
     def get_file_paths():
-        return {
-            "captures": CAPTURES_DIR,
-            "snapshots": SNAPSHOTS_DIR,
-            "videos": VIDEOS_DIR
-        }
+        """Get capture directories (one shared mapping, so read-only)"""
+        return FILE_PATHS
     
     @staticmethod
     def get_face_embeddings_path():
         """Get path to face embeddings file"""
         return FACE_EMBEDDINGS_FILE
     
+    @staticmethod
+    def get_face_embeddings_cache_path():
+        """Get path to binary cache of face embeddings"""
+        return FACE_EMBEDDINGS_CACHE_FILE
+    
     @staticmethod
     def get_face_images_dir():
         """Get directory for face images"""
         return FACE_IMAGES_DIR
     
+    @staticmethod
+    def get_face_save_reference_images():
+        """Whether to save a reference image for each enrolled face"""
+        return FACE_SAVE_REFERENCE_IMAGES
+    
     @staticmethod
     def get_face_metadata_path():
         """Get path to face metadata file"""
         return FACE_METADATA_FILE
     
+    @staticmethod
+    def get_face_max_embeddings_per_person():
+        """Get the maximum number of embeddings kept per enrolled person"""
+        return FACE_MAX_EMBEDDINGS_PER_PERSON
+    
+    @staticmethod
+    def get_face_detection_max_size():
+        """Get longest side of the downscaled frame used for face detection"""
+        return FACE_DETECTION_MAX_SIZE
+    
+    @staticmethod
+    def get_face_detection_upsample():
+        """Get how many times the face detector upsamples the frame"""
+        return FACE_DETECTION_UPSAMPLE
+    
     @staticmethod
     def get_yolo_model():
         return YOLO_MODEL
     
+    @staticmethod
+    def get_verbose():
+        """Whether to print per-event progress output"""
+        return VERBOSE
+    
+    @staticmethod
+    def get_preload_models():
+        """Whether to preload detection models in the background at startup"""
+        return PRELOAD_MODELS
+    
+    @staticmethod
+    def get_yolo_batch_size():
+        """Get number of video frames sent to YOLO per inference call"""
+        return YOLO_BATCH_SIZE
+    
+    @staticmethod
+    def get_yolo_export_config():
+        """Get settings for exporting YOLO to an accelerated runtime"""
+        return {
+            "image_size": YOLO_IMAGE_SIZE,
+            "tensorrt_fp16": YOLO_TENSORRT_FP16,
+            "onnx_cpu": YOLO_ONNX_CPU,
+            "onnx_int8": YOLO_ONNX_INT8,
+            "batch_size": YOLO_BATCH_SIZE
+        }
+    
     @staticmethod
     def get_loitering_threshold():
         """Get dwelling threshold in seconds"""
@@ -112,6 +192,11 @@ class Settings:
         """Get frame skip interval for video analysis"""
         return VIDEO_FRAME_SKIP
     
+    @staticmethod
+    def get_video_hw_decode():
+        """Whether to try hardware H.264 decoding for video analysis"""
+        return VIDEO_HW_DECODE
+    
     @staticmethod
     def get_min_person_confidence():
         """Get minimum confidence for person detection"""
@@ -125,4 +210,4 @@ class Settings:
             "device_id": DEVICE_ID,
             "api_key": DEVICE_API_KEY,
             "sync_interval": CLOUD_SYNC_INTERVAL
-        }
\ No newline at end of file
+        }
@@ -7,8 +7,32 @@ import time
 import cv2
 from datetime import datetime
 from collections import deque
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, List, Optional
 from config.settings import Settings
 
+@dataclass(slots=True)
+class DwellingResult:
+    """Result of a video dwelling analysis"""
+    dwelling_detected: bool = False
+    confidence: float = 0.0
+    message: str = ''
+    video_duration: float = 0.0
+    people_presence_time: float = 0.0
+    presence_percentage: float = 0.0
+    longest_continuous_presence: float = 0.0
+    average_people_count: float = 0.0
+    criteria_met: int = 0
+    dwelling_indicators: List[str] = field(default_factory=list)
+    total_detections: int = 0
+    error: Optional[str] = None
+    # Sharpest, largest person crop seen in the video (RGB), not serialized
+    best_person_frame: Optional[Any] = field(default=None, repr=False, compare=False)
+    
+    def to_dict(self):
+        """Convert to a plain dict (for JSON serialization)"""
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != 'best_person_frame'}
+
 class BehaviorAnalyzer:
     """Analyzes video footage to identify people dwelling/loitering"""
     
@@ -23,6 +47,11 @@ class BehaviorAnalyzer:
         # Video analysis settings
         self.frame_skip = Settings.get_video_frame_skip()  # Analyze every nth frame for efficiency
         self.min_confidence = Settings.get_min_person_confidence()  # Minimum YOLO confidence for person detection
+        self.batch_size = Settings.get_yolo_batch_size()  # Sampled frames per YOLO call
+        self.hw_decode = Settings.get_video_hw_decode()  # Try the V4L2 H.264 decoder first
+        
+        # Decode buffers reused across videos (one slot per frame in a YOLO batch)
+        self._frame_buffers = None
         
     def analyze_video_for_dwelling(self, video_file_path, yolo_handler):
         """
@@ -33,36 +62,32 @@ class BehaviorAnalyzer:
             yolo_handler: YOLOHandler instance for object detection
             
         Returns:
-            dict: Dwelling analysis results
+            DwellingResult: Dwelling analysis results
         """
         if not video_file_path:
-            return {
-                'dwelling_detected': False,
-                'confidence': 0,
-                'message': 'No video file provided',
-                'error': 'Invalid video path'
-            }
+            return DwellingResult(
+                message='No video file provided',
+                error='Invalid video path'
+            )
         
         try:
             # Analyze video for dwelling behavior
             analysis_result = self._analyze_video_file(video_file_path, yolo_handler)
             
-            # Store analysis in history
+            # Store analysis in history, without the decoded person crop
             self.video_analysis_history.append({
                 'timestamp': time.time(),
                 'video_file': video_file_path,
-                'analysis': analysis_result
+                'analysis': replace(analysis_result, best_person_frame=None)
             })
             
             return analysis_result
             
         except Exception as e:
-            return {
-                'dwelling_detected': False,
-                'confidence': 0,
-                'message': f'Video analysis failed: {str(e)}',
-                'error': str(e)
-            }
+            return DwellingResult(
+                message=f'Video analysis failed: {str(e)}',
+                error=str(e)
+            )
     
     def _analyze_video_file(self, video_path, yolo_handler):
         """Analyze video file for dwelling patterns with improved error handling"""
@@ -76,7 +101,7 @@ class BehaviorAnalyzer:
         time.sleep(0.5)
         
         # Open video file
-        cap = cv2.VideoCapture(video_path)
+        cap = self._open_video(video_path)
         
         if not cap.isOpened():
             return self._create_error_result('Could not open video file', 'Video file access failed')
@@ -127,10 +152,54 @@ class BehaviorAnalyzer:
         frame_count = 0
         frames_with_people = 0
         
+        # Sampled frames waiting for a batched YOLO call: (frame_number, frame)
+        pending_frames = []
+        
+        # Fixed for this video; batch_size may be updated at runtime by the config queue
+        batch_size = self.batch_size
+        
+        # Decode straight into preallocated slots instead of a new array per frame
+        frame_buffers = self._get_frame_buffers(
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), batch_size
+        )
+        
+        # Best person crop for face recognition, scored by area * sharpness
+        best_person_frame = None
+        best_person_score = 0.0
+        
+        def run_batch():
+            nonlocal frames_with_people, best_person_frame, best_person_score
+            yolo_results = yolo_handler.process_frames([frame for _, frame in pending_frames])
+            
+            for (frame_number, frame), yolo_result in zip(pending_frames, yolo_results):
+                # Count people in this frame
+                people_in_frame = [d for d in yolo_result['detections'] 
+                                 if d['class_name'] == 'person' and d['confidence'] >= self.min_confidence]
+                
+                if people_in_frame:
+                    frames_with_people += 1
+                    
+                    # Frames are decoded into reused buffers, so keep a copy of the crop
+                    crop, score = self._score_person_crop(frame, people_in_frame)
+                    if crop is not None and score > best_person_score:
+                        best_person_score = score
+                        best_person_frame = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+                    
+                    # Store detection data
+                    frame_time = frame_number / fps
+                    person_detections.append({
+                        'frame': frame_number,
+                        'time': frame_time,
+                        'people_count': len(people_in_frame),
+                        'people_data': people_in_frame
+                    })
+            
+            pending_frames.clear()
+        
         # Analyze frames
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            # grab() advances the decoder without converting/copying the frame out
+            if not cap.grab():
                 break
             
             frame_count += 1
@@ -139,24 +208,21 @@ class BehaviorAnalyzer:
             if frame_count % self.frame_skip != 0:
                 continue
             
-            # Run YOLO detection on frame
-            yolo_result = yolo_handler.process_frame(frame)
-            
-            # Count people in this frame
-            people_in_frame = [d for d in yolo_result['detections'] 
-                             if d['class_name'] == 'person' and d['confidence'] >= self.min_confidence]
+            if frame_buffers is not None:
+                ret, frame = cap.retrieve(frame_buffers[len(pending_frames)])
+            else:
+                ret, frame = cap.retrieve()
+            if not ret:
+                break
             
-            if people_in_frame:
-                frames_with_people += 1
-                
-                # Store detection data
-                frame_time = frame_count / fps
-                person_detections.append({
-                    'frame': frame_count,
-                    'time': frame_time,
-                    'people_count': len(people_in_frame),
-                    'people_data': people_in_frame
-                })
+            # Run YOLO detection once a full batch of frames is collected
+            pending_frames.append((frame_count, frame))
+            if len(pending_frames) >= batch_size:
+                run_batch()
+        
+        # Flush the final partial batch
+        if pending_frames:
+            run_batch()
         
         cap.release()
         
@@ -171,20 +237,72 @@ class BehaviorAnalyzer:
         dwelling_analysis = self._analyze_dwelling_patterns(
             person_detections, actual_video_duration, frames_with_people, frame_count // self.frame_skip
         )
+        dwelling_analysis.best_person_frame = best_person_frame
         
         return dwelling_analysis
     
+    def _score_person_crop(self, frame, people_in_frame):
+        """
+        Crop the largest person in a frame and score it for face recognition
+        
+        Returns:
+            tuple: (BGR crop view or None, bbox area * Laplacian variance)
+        """
+        person = max(people_in_frame, key=lambda d: d['area'])
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in person['bbox_xyxy'])
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, width), min(y2, height)
+        if x2 <= x1 or y2 <= y1:
+            return None, 0.0
+        
+        crop = frame[y1:y2, x1:x2]
+        sharpness = cv2.Laplacian(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var()
+        return crop, person['area'] * sharpness
+    
+    def _get_frame_buffers(self, width, height, batch_size):
+        """
+        Get preallocated decode buffers for frames of the given size
+        
+        Returns None if the video size is unknown, in which case frames are
+        decoded into freshly allocated arrays.
+        """
+        if width <= 0 or height <= 0:
+            return None
+        
+        import numpy as np
+        
+        shape = (batch_size, height, width, 3)
+        if self._frame_buffers is None or self._frame_buffers.shape != shape:
+            self._frame_buffers = np.empty(shape, dtype=np.uint8)
+        return self._frame_buffers
+    
+    def _open_video(self, video_path):
+        """Open a video, preferring the hardware H.264 decoder when enabled"""
+        if self.hw_decode and video_path.lower().endswith('.h264'):
+            # Software FFmpeg decode keeps a core busy for the whole clip; the
+            # VideoCore decoder hands back frames for little CPU
+            pipeline = (
+                f'filesrc location="{video_path}" ! h264parse ! v4l2h264dec ! '
+                'videoconvert ! video/x-raw,format=BGR ! appsink sync=false'
+            )
+            cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+            if cap.isOpened():
+                return cap
+            cap.release()
+            print("⚠️  Hardware H.264 decode unavailable, using software decoder")
+            self.hw_decode = False  # Don't retry the pipeline for every video
+        
+        return cv2.VideoCapture(video_path)
+    
     def _analyze_dwelling_patterns(self, person_detections, video_duration, frames_with_people, total_analyzed_frames):
         """Analyze person detection patterns for dwelling behavior"""
         
         if not person_detections:
-            return {
-                'dwelling_detected': False,
-                'confidence': 0,
-                'video_duration': video_duration,
-                'people_presence_time': 0,
-                'message': 'No people detected in video'
-            }
+            return DwellingResult(
+                video_duration=video_duration,
+                message='No people detected in video'
+            )
         
         # Calculate presence statistics
         people_presence_time = len(person_detections) * self.frame_skip / 30  # Estimate based on frame analysis
@@ -232,19 +350,19 @@ class BehaviorAnalyzer:
         # Calculate average people count
         avg_people_count = sum(d['people_count'] for d in person_detections) / len(person_detections)
         
-        return {
-            'dwelling_detected': dwelling_detected,
-            'confidence': min(dwelling_confidence, 1.0),
-            'video_duration': video_duration,
-            'people_presence_time': people_presence_time,
-            'presence_percentage': round(presence_percentage, 1),
-            'longest_continuous_presence': longest_presence,
-            'average_people_count': round(avg_people_count, 1),
-            'criteria_met': criteria_met,
-            'dwelling_indicators': dwelling_indicators,
-            'total_detections': len(person_detections),
-            'message': self._generate_dwelling_message(dwelling_detected, longest_presence, presence_percentage, avg_people_count)
-        }
+        return DwellingResult(
+            dwelling_detected=dwelling_detected,
+            confidence=min(dwelling_confidence, 1.0),
+            video_duration=video_duration,
+            people_presence_time=people_presence_time,
+            presence_percentage=round(presence_percentage, 1),
+            longest_continuous_presence=longest_presence,
+            average_people_count=round(avg_people_count, 1),
+            criteria_met=criteria_met,
+            dwelling_indicators=dwelling_indicators,
+            total_detections=len(person_detections),
+            message=self._generate_dwelling_message(dwelling_detected, longest_presence, presence_percentage, avg_people_count)
+        )
     
     def _find_continuous_periods(self, detections):
         """Find periods of continuous person presence"""
@@ -295,14 +413,10 @@ class BehaviorAnalyzer:
     
     def _create_error_result(self, message, error_detail):
         """Create standardized error result for failed video analysis"""
-        return {
-            'dwelling_detected': False,
-            'confidence': 0.0,
-            'total_detections': 0,
-            'message': message,
-            'error': error_detail,
-            'analysis_success': False
-        }
+        return DwellingResult(
+            message=message,
+            error=error_detail
+        )
     
     def process_motion_capture_result(self, capture_result, yolo_handler):
         """
@@ -338,9 +452,10 @@ class BehaviorAnalyzer:
         return {
             'analysis_success': True,
             'dwelling_analysis': dwelling_analysis,
-            'dwelling_detected': dwelling_analysis['dwelling_detected'],
-            'confidence': dwelling_analysis['confidence'],
-            'message': dwelling_analysis['message'],
+            'dwelling_detected': dwelling_analysis.dwelling_detected,
+            'confidence': dwelling_analysis.confidence,
+            'message': dwelling_analysis.message,
             'capture_result': capture_result,
-            'video_analyzed': video_file
+            'video_analyzed': video_file,
+            'best_face_frame': dwelling_analysis.best_person_frame
         }
@@ -0,0 +1,95 @@
+"""
+INT8 Calibration for YOLO
+Builds an INT8 TensorRT engine calibrated on snapshots from prior captures
+"""
+
+import os
+import sys
+import heapq
+import shutil
+import tempfile
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Settings
+
+def collect_calibration_images(max_images=500):
+    """Collect the most recent snapshots to use as calibration data"""
+    snapshots_dir = Settings.get_file_paths()['snapshots']
+    if not os.path.isdir(snapshots_dir):
+        return []
+    
+    # One directory pass; DirEntry.stat() reuses the scan instead of a stat per file
+    with os.scandir(snapshots_dir) as entries:
+        snapshots = [
+            (entry.stat().st_mtime, entry.path)
+            for entry in entries
+            if entry.name.endswith('.jpg') and entry.is_file()
+        ]
+    return [path for _, path in heapq.nlargest(max_images, snapshots)]
+
+def build_int8_engine(model_path=None, max_images=500, batch_size=8):
+    """
+    Export an INT8 TensorRT engine for the configured YOLO model
+    
+    Args:
+        model_path: .pt weights to export (defaults to Settings.get_yolo_model())
+        max_images: Maximum number of snapshots used for calibration
+        batch_size: Calibration batch size
+        
+    Returns:
+        str: Path to the .int8.engine file, or None on failure
+    """
+    from ultralytics import YOLO
+    
+    model_path = model_path or Settings.get_yolo_model()
+    images = collect_calibration_images(max_images)
+    if not images:
+        print("❌ No snapshots found for INT8 calibration")
+        return None
+    
+    print(f"📊 Calibrating INT8 engine with {len(images)} snapshots...")
+    if not os.path.isfile(model_path):
+        YOLO(model_path)  # Named weights (e.g. yolo11n.pt) are downloaded on first load
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Export writes .onnx/.engine next to the weights, so export from a copy;
+        # otherwise the cached FP16 engine and the ONNX model would be replaced
+        weights_copy = os.path.join(tmp_dir, os.path.basename(model_path))
+        shutil.copy2(model_path, weights_copy)
+        model = YOLO(weights_copy)
+        
+        # Ultralytics reads calibration data from a dataset YAML whose
+        # val split can be a plain list of image paths
+        image_list = os.path.join(tmp_dir, 'calibration.txt')
+        with open(image_list, 'w') as f:
+            f.write('\n'.join(os.path.abspath(p) for p in images))
+        
+        data_yaml = os.path.join(tmp_dir, 'calibration.yaml')
+        with open(data_yaml, 'w') as f:
+            f.write(f"path: {tmp_dir}\n")
+            f.write(f"train: {image_list}\n")
+            f.write(f"val: {image_list}\n")
+            f.write("names:\n")
+            for class_id, name in model.names.items():
+                f.write(f"  {class_id}: {name}\n")
+        
+        exported_path = model.export(
+            format='engine',
+            int8=True,
+            half=True,  # FP16 fallback for layers without INT8 kernels
+            data=data_yaml,
+            batch=batch_size,
+            imgsz=Settings.get_yolo_export_config()['image_size']
+        )
+        
+        engine_path = f"{os.path.splitext(model_path)[0]}.int8.engine"
+        shutil.move(exported_path, engine_path)
+    
+    print(f"✅ INT8 engine saved: {engine_path}")
+    print(f"   Set YOLO_MODEL = \"{engine_path}\" in config/settings.py to use it")
+    return engine_path
+
+if __name__ == "__main__":
+    build_int8_engine()
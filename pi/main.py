@@ -6,9 +6,14 @@ Integrates PIR, Camera, YOLO, Face Recognition, and Dwelling Analysis
 import os
 import sys
 import time
+import queue
 import signal
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
 import cv2
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -17,13 +22,17 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from sensors.pir import PIRSensor
 from camera.camera_utils import CameraManager
 from vision.yolo_handler import YOLOHandler
-from vision.face_recognition import FaceRecognitionHandler
-from inference.behavior_analyzer import BehaviorAnalyzer
+from vision.face_recognition import FaceRecognitionHandler, FaceResult
+from inference.behavior_analyzer import BehaviorAnalyzer, DwellingResult
 from utils.security_logger import SecurityLogger
 from utils.config_queue import ConfigurationQueue
 from utils.cloud_communicator import CloudCommunicator, CloudConfigurationManager
+from utils.helpers import ensure_directories
 from config.settings import Settings
 
+# Event-path logger; records are formatted and written by a background listener
+logger = logging.getLogger(__name__)
+
 class SecurityCameraSystem:
     """Main security camera system orchestrator"""
     
@@ -34,11 +43,20 @@ class SecurityCameraSystem:
         # System components
         self.camera_manager = None
         self.pir_sensor = None
-        self.yolo_handler = None
-        self.face_recognition = None
+        self._yolo_handler = None  # Loaded on first use, see yolo_handler
+        self._face_recognition = None  # Loaded on first use, see face_recognition
+        self._yolo_lock = threading.Lock()
+        self._face_lock = threading.Lock()
         self.behavior_analyzer = None
         self.security_logger = None
         self.config_queue = None
+        self._event_pool = None  # Runs per-event analysis stages concurrently
+        
+        # Bounded queues between the motion event pipeline stages
+        self._event_queue = queue.Queue(maxsize=4)  # Pending motion events
+        self._face_queue = queue.Queue(maxsize=2)  # Dwelling -> face recognition
+        self._evaluate_queue = queue.Queue(maxsize=2)  # Face recognition -> evaluation
+        self._pipeline_threads = []
         
         # Cloud communication components
         self.cloud_communicator = None
@@ -47,6 +65,22 @@ class SecurityCameraSystem:
         # System state
         self.is_running = False
         self.system_ready = False
+        self._stop_event = threading.Event()  # Set to wake the main loop on shutdown
+        
+        # Route event logging (this module and the utils/ loggers) through a queue
+        # so pipeline threads never block on stdout
+        self._log_listener = None
+        root_logger = logging.getLogger()
+        if not root_logger.handlers:
+            log_queue = queue.Queue(-1)
+            # The record timestamp is taken when the event thread logs it
+            stream_handler = logging.StreamHandler(sys.stdout)
+            stream_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s', datefmt='%H:%M:%S'))
+            self._log_listener = QueueListener(log_queue, stream_handler)
+            self._log_listener.start()
+            root_logger.addHandler(QueueHandler(log_queue))
+            # Non-verbose: info records are dropped before any formatting happens
+            root_logger.setLevel(logging.INFO if Settings.get_verbose() else logging.WARNING)
         
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -66,20 +100,21 @@ class SecurityCameraSystem:
             if not self.camera_manager.setup():
                 raise Exception("Camera initialization failed")
             
-            # Set motion callback to process events
+            # Motion events are only queued on the camera thread, never analyzed there
             self.camera_manager.set_motion_callback(self.process_motion_event)
             
-            print("🎯 Loading YOLO model...")
-            self.yolo_handler = YOLOHandler()
-            
-            print("👤 Initializing face recognition...")
-            self.face_recognition = FaceRecognitionHandler()
-            
             print("🧠 Initializing behavior analyzer...")
             self.behavior_analyzer = BehaviorAnalyzer()
             
+            # One persistent pool for all events - never created per event
+            if self._event_pool is None:
+                self._event_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="analysis")
+            
+            if not self._pipeline_threads:
+                self._start_event_pipeline()
+            
             print("📡 Initializing PIR sensor...")
-            self.pir_sensor = PIRSensor(camera_manager=self.camera_manager)
+            self.pir_sensor = PIRSensor()
             if not self.pir_sensor.setup():
                 raise Exception("PIR sensor initialization failed")
             
@@ -116,6 +151,14 @@ class SecurityCameraSystem:
             else:
                 print("ℹ️  No cloud API key provided - running in offline mode")
             
+            # Models load lazily; optionally preload them in the background so
+            # startup isn't blocked but the first event is still fast
+            if Settings.get_preload_models():
+                print("🔥 Preloading detection models in background...")
+                threading.Thread(target=self._warmup_models, name="model-preload", daemon=True).start()
+            else:
+                print("💤 Detection models will load on first motion event")
+            
             self.system_ready = True
             print("✅ Security system initialization complete!")
             return True
@@ -125,17 +168,57 @@ class SecurityCameraSystem:
             return False
     
     def _ensure_directories(self):
-        """Ensure all required directories exist"""
+        """Ensure all required directories exist (only once per process)"""
         file_paths = Settings.get_file_paths()
-        directories = [
+        ensure_directories(
             file_paths['captures'],
-            file_paths['snapshots'], 
+            file_paths['snapshots'],
             file_paths['videos'],
             os.path.join(file_paths['captures'], 'logs')
-        ]
+        )
+    
+    @property
+    def yolo_handler(self):
+        """YOLO handler, loaded on first access"""
+        if self._yolo_handler is None:
+            with self._yolo_lock:
+                if self._yolo_handler is None:
+                    print("🎯 Loading YOLO model...")
+                    self._yolo_handler = YOLOHandler()
+        return self._yolo_handler
+    
+    @property
+    def face_recognition(self):
+        """Face recognition handler, loaded on first access"""
+        if self._face_recognition is None:
+            with self._face_lock:
+                if self._face_recognition is None:
+                    print("👤 Initializing face recognition...")
+                    self._face_recognition = FaceRecognitionHandler()
+        return self._face_recognition
+    
+    def _warmup_models(self):
+        """Load models and run dummy inferences so the first motion event isn't slowed by model setup"""
+        start = time.time()
+        
+        # The models are independent, so load them in parallel (disk reads and
+        # native init in torch/dlib largely release the GIL)
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-load") as pool:
+            futures = {
+                'YOLO': pool.submit(lambda: self.yolo_handler.warmup()),
+                'Face recognition': pool.submit(lambda: self.face_recognition.warmup())
+            }
         
-        for directory in directories:
-            os.makedirs(directory, exist_ok=True)
+        failed = False
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                failed = True
+                print(f"⚠️  {name} warmup failed (continuing): {e}")
+        
+        if not failed:
+            print(f"   Models warmed up in {time.time() - start:.1f}s")
     
     def start_monitoring(self):
         """Start the main monitoring loop"""
@@ -148,8 +231,9 @@ class SecurityCameraSystem:
         print("📊 System Status:")
         print(f"   - PIR Sensor: {'✅ Active' if self.pir_sensor.is_monitoring else '❌ Inactive'}")
         print(f"   - Camera: {'✅ Ready' if self.camera_manager.is_initialized else '❌ Not Ready'}")
-        print(f"   - YOLO Model: ✅ Loaded ({Settings.get_yolo_model()})")
-        print(f"   - Face Recognition: ✅ Ready")
+        model_state = "🔥 Preloading" if Settings.get_preload_models() else "💤 Loads on first event"
+        print(f"   - YOLO Model: {'✅ Loaded' if self._yolo_handler else model_state} ({Settings.get_yolo_model()})")
+        print(f"   - Face Recognition: {'✅ Ready' if self._face_recognition else model_state}")
         print(f"   - Config Queue: ✅ Active")
         print(f"   - Cloud Communication: {'✅ Connected' if self.cloud_communicator else '❌ Offline'}")
         print("Press Ctrl+C to stop monitoring...\n")
@@ -158,14 +242,10 @@ class SecurityCameraSystem:
         
         try:
             # Main monitoring loop
-            while self.is_running:
-                # Check for motion capture results
-                # Note: The actual motion detection happens in background threads
-                # Here we just keep the main thread alive and could add periodic tasks
-                
-                time.sleep(1)  # Check every second
-                
-                # Optional: Add periodic status checks, cleanup, etc.
+            # Note: The actual motion detection happens in background threads.
+            # Here we just park the main thread until shutdown is requested;
+            # the signal handler sets the event for an immediate wakeup
+            self._stop_event.wait()
                 
         except KeyboardInterrupt:
             print("\n🛑 Monitoring stopped by user")
@@ -176,105 +256,180 @@ class SecurityCameraSystem:
     
     def process_motion_event(self, capture_result):
         """
-        Process a motion detection event with full analysis
-        This method would be called by the camera system when motion is detected
+        Queue a motion detection event for analysis (non-blocking)
+        
+        Called by the camera system when motion is detected. Events flow
+        through three pipeline stages, each on its own thread:
+        dwelling analysis -> face recognition -> evaluation/logging
         """
-        print(f"\n🎯 Processing motion event at {datetime.now().strftime('%H:%M:%S')}")
+        while True:
+            try:
+                self._event_queue.put_nowait(capture_result)
+                return
+            except queue.Full:
+                # Drop the oldest pending event in favour of the newest
+                try:
+                    dropped = self._event_queue.get_nowait()
+                    if dropped is not None:
+                        logger.warning("⚠️  Event backlog full, dropping event from %s", dropped.get('timestamp'))
+                except queue.Empty:
+                    pass
+    
+    def _start_event_pipeline(self):
+        """Start the three event pipeline stage threads"""
+        stages = [
+            ("dwelling", self._dwelling_stage, self._event_queue, self._face_queue),
+            ("faces", self._face_stage, self._face_queue, self._evaluate_queue),
+            ("evaluate", self._evaluate_stage, self._evaluate_queue, None),
+        ]
+        for name, stage, in_queue, out_queue in stages:
+            thread = threading.Thread(
+                target=self._pipeline_worker,
+                args=(stage, in_queue, out_queue),
+                name=f"event-{name}",
+                daemon=True
+            )
+            thread.start()
+            self._pipeline_threads.append(thread)
+    
+    def _pipeline_worker(self, stage, in_queue, out_queue):
+        """Run one pipeline stage; bounded out_queue gives back-pressure upstream"""
+        while True:
+            item = in_queue.get()
+            if item is None:  # Shutdown sentinel, pass it downstream
+                if out_queue is not None:
+                    out_queue.put(None)
+                break
+            
+            try:
+                result = stage(item)
+            except Exception as e:
+                logger.error("❌ Motion event processing error: %s", e)
+                continue
+            
+            if result is not None and out_queue is not None:
+                out_queue.put(result)
+    
+    def _dwelling_stage(self, capture_result):
+        """Stage 1: analyze the event video for dwelling behavior"""
+        logger.info("🎯 Processing motion event")
         
         if not capture_result.get('success', False):
-            print("❌ Motion capture failed")
-            return
+            logger.error("❌ Motion capture failed")
+            return None
+        
+        # Snapshot face recognition doesn't depend on the video, so start it now
+        # and let it run concurrently with dwelling analysis
+        face_future = None
+        if capture_result.get('snapshot'):
+            face_future = self._event_pool.submit(self._analyze_snapshot_faces, capture_result)
         
-        # Step 1: Analyze video for dwelling behavior
-        print("🧠 Analyzing video for dwelling behavior...")
+        logger.info("🧠 Analyzing video for dwelling behavior...")
         dwelling_result = self.behavior_analyzer.process_motion_capture_result(
             capture_result, self.yolo_handler
         )
         
         if not dwelling_result['analysis_success']:
-            print(f"❌ Dwelling analysis failed: {dwelling_result['message']}")
-            return
+            logger.error("❌ Dwelling analysis failed: %s", dwelling_result['message'])
+            if face_future:
+                face_future.cancel()
+            return None
         
         dwelling_analysis = dwelling_result['dwelling_analysis']
-        people_detected = dwelling_analysis.get('total_detections', 0) > 0
+        logger.info("📊 Dwelling Analysis: %s", dwelling_analysis.message)
         
-        print(f"📊 Dwelling Analysis: {dwelling_analysis['message']}")
+        return capture_result, dwelling_result, face_future
+    
+    def _face_stage(self, item):
+        """Stage 2: collect face recognition results if people were detected"""
+        capture_result, dwelling_result, face_future = item
+        dwelling_analysis = dwelling_result['dwelling_analysis']
         
-        # Step 2: Face recognition if people detected
-        known_people = []
-        unknown_people = []
+        # Face recognition results are only used if people detected
         face_analysis = None
         
-        if people_detected:
-            print("👤 People detected - running face recognition...")
+        if dwelling_analysis.total_detections > 0:
+            logger.info("👤 People detected - collecting face recognition results...")
             
-            # Get snapshot for face recognition
-            snapshot_file = capture_result.get('snapshot')
-            if snapshot_file:
-                # Load the image file as numpy array for face recognition
-                try:
-                    snapshot_frame = cv2.imread(snapshot_file)
-                    if snapshot_frame is not None:
-                        # Convert BGR to RGB for face_recognition library
-                        snapshot_frame = cv2.cvtColor(snapshot_frame, cv2.COLOR_BGR2RGB)
-                        face_analysis = self.face_recognition.analyze_frame_for_threats(snapshot_frame)
-                    else:
-                        print(f"❌ Could not load snapshot file: {snapshot_file}")
-                        face_analysis = {'threat_detected': False, 'total_faces': 0, 'message': 'Could not load snapshot'}
-                except Exception as e:
-                    print(f"❌ Error loading snapshot for face recognition: {e}")
-                    face_analysis = {'threat_detected': False, 'total_faces': 0, 'message': f'Error loading snapshot: {e}'}
-                
+            if face_future:
+                face_analysis = face_future.result()
+            
+            # The analyzer's best person crop from the video is already decoded;
+            # use it when the snapshot had no usable faces
+            best_face_frame = dwelling_result.get('best_face_frame')
+            if best_face_frame is not None and (face_analysis is None or face_analysis.total_faces == 0):
+                logger.info("👤 Retrying face recognition on best video frame...")
+                face_analysis = self.face_recognition.analyze_frame_for_threats(best_face_frame)
+            
+            if face_analysis:
                 # Parse face recognition results
-                if face_analysis.get('total_faces', 0) > 0:
-                    known_count = face_analysis.get('known_faces', 0)
-                    unknown_count = face_analysis.get('unknown_faces', 0)
-                    faces_list = face_analysis.get('faces', [])
-                    
-                    print(f"👥 Face Recognition Results:")
-                    print(f"   - Total faces: {face_analysis.get('total_faces', 0)}")
-                    print(f"   - Known people: {known_count}")
-                    print(f"   - Unknown people: {unknown_count}")
-                    print(f"   - Message: {face_analysis.get('message', 'N/A')}")
+                if face_analysis.total_faces > 0:
+                    logger.info("👥 Face Recognition Results:")
+                    logger.info("   - Total faces: %d", face_analysis.total_faces)
+                    logger.info("   - Known people: %d", face_analysis.known_faces)
+                    logger.info("   - Unknown people: %d", face_analysis.unknown_faces)
+                    logger.info("   - Message: %s", face_analysis.message or 'N/A')
                 else:
-                    print("👤 No faces detected in frame")
+                    logger.info("👤 No faces detected in frame")
             else:
-                print("⚠️  No snapshot available for face recognition")
+                logger.warning("⚠️  No snapshot available for face recognition")
+        elif face_future:
+            face_future.cancel()
         
-        # Step 3: Determine alert level and log event
-        self._evaluate_security_event(dwelling_analysis, known_people, unknown_people, face_analysis, capture_result)
+        return dwelling_analysis, face_analysis, capture_result
+    
+    def _evaluate_stage(self, item):
+        """Stage 3: determine alert level and log event"""
+        self._evaluate_security_event(*item)
+        return None
     
-    def _evaluate_security_event(self, dwelling_analysis, known_people, unknown_people, face_analysis, capture_result):
+    def _analyze_snapshot_faces(self, capture_result):
+        """Load the event snapshot as RGB and run face recognition on it"""
+        snapshot_file = capture_result.get('snapshot')
+        
+        # Reuse the in-memory RGB capture, fall back to decoding the file
+        try:
+            snapshot_frame = capture_result.get('snapshot_rgb')
+            if snapshot_frame is None:
+                snapshot_frame = cv2.imread(snapshot_file)
+                if snapshot_frame is not None:
+                    # BGR to RGB as a free channel-swapped view; the face handler
+                    # only copies the regions it actually needs contiguous
+                    snapshot_frame = snapshot_frame[:, :, ::-1]
+            if snapshot_frame is not None:
+                return self.face_recognition.analyze_frame_for_threats(snapshot_frame)
+            
+            logger.error("❌ Could not load snapshot file: %s", snapshot_file)
+            return FaceResult(message='Could not load snapshot')
+        except Exception as e:
+            logger.error("❌ Error loading snapshot for face recognition: %s", e)
+            return FaceResult(message=f'Error loading snapshot: {e}')
+    
+    def _evaluate_security_event(self, dwelling_analysis: DwellingResult, face_analysis: Optional[FaceResult], capture_result: dict):
         """Evaluate security event and determine appropriate response"""
         
-        # Ensure known_people and unknown_people are properly handled
-        if isinstance(known_people, list):
-            known_people_count = len(known_people)
-            known_people_list = known_people
-        else:
-            known_people_count = known_people if known_people else 0
-            known_people_list = []
-            
-        if isinstance(unknown_people, list):
-            unknown_people_count = len(unknown_people)
-        else:
-            unknown_people_count = unknown_people if unknown_people else 0
+        # Known/unknown people come straight from the face analysis
+        faces = face_analysis or FaceResult()
+        known_people_list = faces.known_people
+        unknown_people_list = faces.unknown_people
+        known_people_count = len(known_people_list)
+        unknown_people_count = len(unknown_people_list)
         
         try:
             # Log the event locally
             log_entry = self.security_logger.log_dwelling_event(
-                dwelling_analysis, known_people_count, unknown_people_count
+                dwelling_analysis, known_people_list, unknown_people_list
             )
             
             # Log face recognition if available
             if face_analysis:
                 self.security_logger.log_face_recognition_event(face_analysis)
         except Exception as e:
-            print(f"Local logging error: {e}")
+            logger.error("Local logging error: %s", e)
             return
         
         # Determine response based on analysis
-        dwelling_detected = dwelling_analysis.get('dwelling_detected', False)
+        dwelling_detected = dwelling_analysis.dwelling_detected
         has_unknown_people = unknown_people_count > 0
         
         # Determine if we should send to cloud (cost-conscious decision)
@@ -283,10 +438,10 @@ class SecurityCameraSystem:
         priority = False
         
         if dwelling_detected and has_unknown_people:
-            print("🚨 SECURITY ALERT: Unknown person dwelling detected!")
-            print(f"   Duration: {dwelling_analysis.get('longest_continuous_presence', 0):.1f}s")
-            print(f"   Confidence: {dwelling_analysis.get('confidence', 0):.2f}")
-            print(f"   Unknown people: {unknown_people_count}")
+            logger.warning("🚨 SECURITY ALERT: Unknown person dwelling detected!")
+            logger.warning("   Duration: %.1fs", dwelling_analysis.longest_continuous_presence)
+            logger.warning("   Confidence: %.2f", dwelling_analysis.confidence)
+            logger.warning("   Unknown people: %d", unknown_people_count)
             
             # HIGH PRIORITY: Send to cloud for LLM analysis
             should_send_to_cloud = True
@@ -294,21 +449,21 @@ class SecurityCameraSystem:
             priority = True
             
         elif dwelling_detected and known_people_count > 0:
-            print("⚠️  Known person dwelling detected")
-            print(f"   Duration: {dwelling_analysis.get('longest_continuous_presence', 0):.1f}s")
-            if known_people_list:
-                names = [p.get('name', 'Unknown') for p in known_people_list]
-                print(f"   Known people: {', '.join(names)}")
+            logger.info("⚠️  Known person dwelling detected")
+            logger.info("   Duration: %.1fs", dwelling_analysis.longest_continuous_presence)
+            if known_people_list and logger.isEnabledFor(logging.INFO):
+                names = [p['person_name'] for p in known_people_list]
+                logger.info("   Known people: %s", ', '.join(names))
             
             # MEDIUM PRIORITY: Send to cloud for analysis (might be suspicious)
-            dwelling_duration = dwelling_analysis.get('longest_continuous_presence', 0)
+            dwelling_duration = dwelling_analysis.longest_continuous_presence
             if dwelling_duration > 60:  # Only if dwelling > 1 minute
                 should_send_to_cloud = True
                 event_type = "dwelling_known_person"
                 priority = False
             
         elif has_unknown_people:
-            print("👁️  Unknown person detected (brief presence)")
+            logger.info("👁️  Unknown person detected (brief presence)")
             
             # SEND TO CLOUD: Unknown person always needs analysis
             should_send_to_cloud = True
@@ -316,16 +471,16 @@ class SecurityCameraSystem:
             priority = False
             
         elif known_people_count > 0:
-            print("✅ Known person detected")
-            if known_people_list:
-                names = [p.get('name', 'Unknown') for p in known_people_list]
-                print(f"   People: {', '.join(names)}")
+            logger.info("✅ Known person detected")
+            if known_people_list and logger.isEnabledFor(logging.INFO):
+                names = [p['person_name'] for p in known_people_list]
+                logger.info("   People: %s", ', '.join(names))
             
             # NO CLOUD: Known person, brief presence - save costs
             should_send_to_cloud = False
             
         else:
-            print("ℹ️  Motion detected - person analysis inconclusive")
+            logger.info("ℹ️  Motion detected - person analysis inconclusive")
             
             # NO CLOUD: Inconclusive motion - save costs
             should_send_to_cloud = False
@@ -340,23 +495,23 @@ class SecurityCameraSystem:
                 priority=priority
             )
         elif should_send_to_cloud:
-            print("⚠️  Would send to cloud but no connection available")
+            logger.warning("⚠️  Would send to cloud but no connection available")
     
-    def _send_event_to_cloud(self, event_type: str, dwelling_analysis: dict, face_analysis: dict, capture_result: dict, priority: bool = False):
+    def _send_event_to_cloud(self, event_type: str, dwelling_analysis: DwellingResult, face_analysis: Optional[FaceResult], capture_result: dict, priority: bool = False):
         """Send event to cloud for LLM analysis"""
         try:
             # Prepare detected objects from dwelling analysis
             detected_objects = []
-            if dwelling_analysis.get('total_detections', 0) > 0:
+            if dwelling_analysis.total_detections > 0:
                 detected_objects.append({
                     'class': 'person',
-                    'confidence': dwelling_analysis.get('confidence', 0.0),
-                    'count': dwelling_analysis.get('total_detections', 0)
+                    'confidence': dwelling_analysis.confidence,
+                    'count': dwelling_analysis.total_detections
                 })
             
             # Calculate overall confidence score
-            confidence_score = dwelling_analysis.get('confidence', 0.0)
-            if face_analysis and face_analysis.get('total_faces', 0) > 0:
+            confidence_score = dwelling_analysis.confidence
+            if face_analysis and face_analysis.total_faces > 0:
                 confidence_score = max(confidence_score, 0.8)  # High confidence if faces detected
             
             # Get file paths
@@ -364,34 +519,36 @@ class SecurityCameraSystem:
             video_path = capture_result.get('video')
             
             if not snapshot_path:
-                print("❌ No snapshot available for cloud upload")
+                logger.error("❌ No snapshot available for cloud upload")
                 return
             
-            print(f"📤 Sending {event_type} to cloud (priority: {priority})...")
+            logger.info("📤 Sending %s to cloud (priority: %s)...", event_type, priority)
             
             success = self.cloud_communicator.send_security_event(
                 event_type=event_type,
                 confidence_score=confidence_score,
                 detected_objects=detected_objects,
-                face_analysis=face_analysis or {},
-                dwelling_analysis=dwelling_analysis,
+                face_analysis=face_analysis.to_dict() if face_analysis else {},
+                dwelling_analysis=dwelling_analysis.to_dict(),
                 snapshot_path=snapshot_path,
                 video_path=video_path,
-                priority=priority
+                priority=priority,
+                snapshot_bytes=capture_result.get('snapshot_jpeg')
             )
             
             if success:
-                print("✅ Event queued for cloud analysis")
+                logger.info("✅ Event queued for cloud analysis")
             else:
-                print("❌ Failed to queue event for cloud")
+                logger.error("❌ Failed to queue event for cloud")
                 
         except Exception as e:
-            print(f"❌ Error sending event to cloud: {e}")
+            logger.error("❌ Error sending event to cloud: %s", e)
     
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals"""
         print(f"\n🛑 Received signal {signum}, shutting down gracefully...")
         self.is_running = False
+        self._stop_event.set()
     
     def shutdown_system(self):
         """Gracefully shutdown the system"""
@@ -406,6 +563,18 @@ class SecurityCameraSystem:
                 print("📷 Stopping camera...")
                 self.camera_manager.cleanup()
             
+            if self._pipeline_threads:
+                print("🎯 Stopping event pipeline...")
+                self.process_motion_event(None)  # Sentinel flows through every stage
+                for thread in self._pipeline_threads:
+                    thread.join(timeout=30)
+                self._pipeline_threads = []
+            
+            if self._event_pool:
+                print("🧵 Stopping analysis workers...")
+                self._event_pool.shutdown(wait=True)
+                self._event_pool = None
+            
             if self.config_queue:
                 print("📋 Stopping configuration queue...")
                 self.config_queue.cleanup()
@@ -418,6 +587,14 @@ class SecurityCameraSystem:
                 print("🌐 Stopping cloud communication...")
                 self.cloud_communicator.stop()
             
+            if self.security_logger:
+                # Writes out any queued security log entries
+                self.security_logger.close()
+            
+            if self._log_listener:
+                # Flushes any queued event log records
+                self._log_listener.stop()
+            
             print("✅ Security system shutdown complete")
             
         except Exception as e:
@@ -440,6 +617,8 @@ def main():
         security_system.start_monitoring()
     else:
         print("❌ Failed to initialize security system")
+        # Release whatever was claimed (GPIO line, camera) before exiting
+        security_system.shutdown_system()
         sys.exit(1)
 
 
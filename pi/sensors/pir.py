@@ -1,120 +1,195 @@
 """
 PIR Motion Sensor Handler
-Detects motion using GPIO and triggers camera via events
+Detects motion using GPIO edge events; the camera thread waits on them directly
 """
 
+import os
+import math
 import time
+import select
+import logging
 import threading
-import RPi.GPIO as GPIO
+from datetime import timedelta
+import gpiod  # pip install gpiod (libgpiod v2 bindings)
+from gpiod.line import Bias, Direction, Edge, Value
 from config.settings import Settings
 
+logger = logging.getLogger(__name__)
+
+# Physical (BOARD) header pin -> GPIO line offset on the header's gpiochip
+BOARD_TO_LINE = {
+    3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22, 16: 23,
+    18: 24, 19: 10, 21: 9, 22: 25, 23: 11, 24: 8, 26: 7, 27: 0, 28: 1, 29: 5,
+    31: 6, 32: 12, 33: 13, 35: 19, 36: 16, 37: 26, 38: 20, 40: 21
+}
+
 class PIRSensor:
-    """PIR motion sensor interface with event-based communication"""
+    """PIR motion sensor interface; motion is consumed via wait_for_motion()"""
     
-    def __init__(self, camera_manager=None):
+    def __init__(self):
         """Initialize PIR sensor on specified GPIO pin"""
         self.pin = Settings.get_pir_pin()
-        self.motion_event = threading.Event()  # Event for communication with camera
+        self.line_offset = BOARD_TO_LINE[self.pin]
+        self.chip_path = Settings.get_pir_gpio_chip()
+        self.line_request = None  # libgpiod line request, held while monitoring
         self.is_monitoring = False
-        self.monitor_thread = None
-        self.camera_manager = camera_manager  # Reference to camera for busy checking
-
+        # Held while the line request is in use; cleanup() takes it before release()
+        self._line_lock = threading.RLock()
+        self._wake_fd = None  # eventfd written by cleanup() to wake a blocked wait
+        self._poller = None
+        
+        # Trigger state, only touched by the thread calling wait_for_motion()
+        self.debounce_delay_ns = 10_000_000_000  # Increased to 10 seconds between detections
+        self._last_motion_ns = None  # monotonic_ns of the last accepted trigger
+        # No new edge arrives while the PIR output stays high, so after a
+        # trigger or a debounced one re-read the level then
+        self._recheck_at_ns = None
+    
     def setup(self):
         """Configure GPIO and sensor"""
         try:
-            GPIO.setmode(GPIO.BOARD)
-            GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+            # The kernel debounces and timestamps rising edges and wakes whoever
+            # waits on them; nothing polls the pin
+            self.line_request = gpiod.request_lines(
+                self.chip_path,
+                consumer="pir",
+                config={
+                    self.line_offset: gpiod.LineSettings(
+                        direction=Direction.INPUT,
+                        edge_detection=Edge.RISING,
+                        bias=Bias.PULL_DOWN,
+                        # Filters comparator chatter in the gpiolib driver (hrtimer),
+                        # so bounces never wake userspace
+                        debounce_period=timedelta(milliseconds=Settings.get_pir_edge_debounce_ms())
+                    )
+                }
+            )
+            # Closing the request fd does not wake a poll() already blocked on it,
+            # so waits also watch an eventfd that cleanup() signals
+            self._wake_fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            self._poller = select.poll()
+            self._poller.register(self.line_request.fd, select.POLLIN)
+            self._poller.register(self._wake_fd, select.POLLIN)
             self.is_monitoring = True
-            self.monitor_thread = threading.Thread(target=self._monitor_motion)
-            self.monitor_thread.daemon = True  # Thread dies when main program ends
-            self.monitor_thread.start()
             print("PIR sensor setup complete")
             return True
         except Exception as e:
             print(f"Error in PIR Sensor setup: {e}")
             return False
-
+    
     def setup_check(self):
         """Check if GPIO is configured correctly"""
         try:
-            GPIO.setup(self.pin, GPIO.IN)
+            with gpiod.Chip(self.chip_path) as chip:
+                chip.get_line_info(self.line_offset)
             return True
         except Exception as e:
             print(f"Error in PIR Sensor setup_check: {e}")
             return False
-
+    
+    def fileno(self):
+        """Edge event fd, for callers multiplexing the sensor with select/epoll"""
+        return self.line_request.fd
+    
     def is_motion_detected(self):
         """Check current if motion is detected"""
         try:
-            return GPIO.input(self.pin) == GPIO.HIGH
+            with self._line_lock:
+                if self.line_request is None:
+                    return False
+                return self.line_request.get_value(self.line_offset) == Value.ACTIVE
         except Exception as e:
-            print(f"Error in PIR Sensor is_motion_detected: {e}")
+            logger.error("Error in PIR Sensor is_motion_detected: %s", e)
+            return False
+    
+    def _wait_for_rising_edge(self, timeout):
+        """Block until the PIR output rises, cleanup() is called, or timeout (seconds) passes"""
+        ready = dict(self._poller.poll(math.ceil(timeout * 1000)))
+        if self._wake_fd in ready or self.line_request.fd not in ready:
             return False
+        # Drain everything queued so a burst of edges counts as one trigger
+        self.line_request.read_edge_events()
+        return True
+    
+    def _accept_trigger(self):
+        """Apply debounce to a detected motion"""
+        now_ns = time.monotonic_ns()
         
-    def _monitor_motion(self):
-        """Background thread to monitor motion and trigger events"""
-        last_motion_time = 0
-        debounce_delay = 10.0  # Increased to 10 seconds between detections
-        consecutive_skips = 0
-        max_consecutive_skips = 5
+        # Debounce - prevent rapid triggers
+        if self._last_motion_ns is not None and now_ns - self._last_motion_ns <= self.debounce_delay_ns:
+            self._recheck_at_ns = self._last_motion_ns + self.debounce_delay_ns
+            return False
         
+        # A person who stays in view holds the output high without a new edge;
+        # re-read the level once the debounce window expires to re-trigger
+        self._recheck_at_ns = now_ns + self.debounce_delay_ns
+        self._last_motion_ns = now_ns
+        # Wall-clock time is added by the log formatter, only if the record is emitted
+        logger.info("PIR: Motion detected")
+        return True
+    
+    def wait_for_motion(self, timeout=10.0):
+        """
+        Wait for a debounced motion trigger - used by camera thread
+        
+        Edge events are read in the calling thread, so no monitor thread
+        sits between the GPIO line and the camera.
+        """
+        if not self.is_monitoring:
+            time.sleep(timeout)  # Released sensor behaves like a quiet one
+            return False
+        
+        deadline_ns = time.monotonic_ns() + int(timeout * 1e9)
         while self.is_monitoring:
-            try:
-                current_time = time.time()
+            now_ns = time.monotonic_ns()
+            wait_ns = deadline_ns - now_ns
+            if wait_ns <= 0:
+                return False
+            if self._recheck_at_ns is not None:
+                wait_ns = min(wait_ns, max(self._recheck_at_ns - now_ns, 0))
+            
+            with self._line_lock:
+                if not self.is_monitoring:
+                    return False  # cleanup() got the lock first
+                edge = self._wait_for_rising_edge(wait_ns / 1e9)
                 
-                if self.is_motion_detected():
-                    # Debounce - prevent rapid triggers
-                    if current_time - last_motion_time > debounce_delay:
-                        # CHECK IF CAMERA IS BUSY - Don't trigger if busy
-                        if self.camera_manager and self.camera_manager.camera_is_busy():
-                            consecutive_skips += 1
-                            if consecutive_skips <= max_consecutive_skips:
-                                print(f"PIR: Motion detected but camera busy, skipping... ({consecutive_skips}/{max_consecutive_skips})")
-                            elif consecutive_skips == max_consecutive_skips + 1:
-                                print("PIR: Camera busy for too long, reducing frequency...")
-                            time.sleep(2.0)  # Wait longer when camera is busy
-                            continue
-                        
-                        # Reset skip counter on successful trigger
-                        consecutive_skips = 0
-                        last_motion_time = current_time
-                        print(f"PIR: Motion detected at {time.strftime('%H:%M:%S')}")
-                        
-                        # SIGNAL CAMERA THREAD
-                        self.motion_event.set()
-                        
-                        # Wait longer after triggering to prevent immediate retriggering
-                        time.sleep(1.0)
-                        self.motion_event.clear()
-                        
-                        # Additional cooldown period
-                        time.sleep(2.0)
-                    else:
-                        # Still in debounce period
-                        time.sleep(0.5)
-                else:
-                    # No motion detected, short sleep
-                    time.sleep(0.1)
-                    
-            except Exception as e:
-                print(f"PIR monitoring error: {e}")
-                time.sleep(1.0)
-    
-    def wait_for_motion(self, timeout=None):
-        """Wait for motion detection event - used by camera thread"""
-        return self.motion_event.wait(timeout)
+                if not edge:
+                    if self._recheck_at_ns is None or time.monotonic_ns() < self._recheck_at_ns:
+                        continue
+                    self._recheck_at_ns = None
+                    if not self.is_motion_detected():
+                        continue
+            
+            if self._accept_trigger():
+                return True
+        return False
     
-    def stop_monitoring(self):
-        """Stop motion monitoring"""
+    def cleanup(self):
+        """Clean up GPIO resources, waking and waiting out a blocked wait_for_motion()"""
         self.is_monitoring = False
-        if self.monitor_thread and self.monitor_thread.is_alive():
-            self.monitor_thread.join(timeout=2.0)
+        if self._wake_fd is not None:
+            os.eventfd_write(self._wake_fd, 1)
+        
+        # The waiter holds the lock while it uses the request, so once we have
+        # it no thread is still inside libgpiod on this request
+        with self._line_lock:
+            line_request, self.line_request = self.line_request, None
+            try:
+                if line_request:
+                    line_request.release()
+            except Exception as e:
+                logger.warning("Error releasing PIR GPIO line: %s", e)
+            
+            if self._wake_fd is not None:
+                os.close(self._wake_fd)
+                self._wake_fd = None
+                self._poller = None
     
-    def cleanup(self):
-        """Clean up GPIO resources"""
-        self.stop_monitoring()
-        try:
-            GPIO.cleanup(self.pin)
-        except:
-            pass
-
+    def __enter__(self):
+        if not self.setup():
+            raise RuntimeError("PIR sensor initialization failed")
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+        return False
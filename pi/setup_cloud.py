@@ -6,6 +6,7 @@ Helps configure the Pi device for cloud communication
 
 import os
 import sys
+import ast
 import json
 import uuid
 from typing import Dict, Any
@@ -37,8 +38,10 @@ def create_config_file(config: Dict[str, Any]) -> bool:
         # Ensure config directory exists
         os.makedirs(os.path.dirname(config_file), exist_ok=True)
         
+        # Encode up front so the file gets one write instead of one per JSON token
+        payload = json.dumps(config, indent=2) + '\n'
         with open(config_file, 'w') as f:
-            json.dump(config, f, indent=2)
+            f.write(payload)
         
         print(f"✅ Configuration saved to: {config_file}")
         return True
@@ -51,28 +54,38 @@ def update_settings_file(api_url: str, device_id: str, api_key: str) -> bool:
     """Update the settings.py file with cloud configuration"""
     try:
         settings_file = "config/settings.py"
+        updates = {
+            'CLOUD_API_URL': api_url,
+            'DEVICE_ID': device_id,
+            'DEVICE_API_KEY': api_key
+        }
         
         # Read current settings
         with open(settings_file, 'r') as f:
             content = f.read()
         
-        # Update cloud settings
-        lines = content.split('\n')
-        updated_lines = []
-        
-        for line in lines:
-            if line.strip().startswith('CLOUD_API_URL ='):
-                updated_lines.append(f'CLOUD_API_URL = "{api_url}"')
-            elif line.strip().startswith('DEVICE_ID ='):
-                updated_lines.append(f'DEVICE_ID = "{device_id}"')
-            elif line.strip().startswith('DEVICE_API_KEY ='):
-                updated_lines.append(f'DEVICE_API_KEY = "{api_key}"')
-            else:
-                updated_lines.append(line)
+        # Locate the module-level assignments with the parser, then replace only
+        # the value expression so comments and formatting are kept. AST column
+        # offsets are UTF-8 byte offsets, hence the splice on encoded lines.
+        lines = content.splitlines(keepends=True)
+        for node in ast.parse(content).body:
+            if not (isinstance(node, ast.Assign) and len(node.targets) == 1
+                    and isinstance(node.targets[0], ast.Name)
+                    and node.targets[0].id in updates
+                    and node.value.lineno == node.value.end_lineno):
+                continue
+            
+            value = node.value
+            line = lines[value.lineno - 1].encode('utf-8')
+            # json.dumps gives a double-quoted, correctly escaped Python string literal
+            literal = json.dumps(updates[node.targets[0].id]).encode('utf-8')
+            lines[value.lineno - 1] = (
+                line[:value.col_offset] + literal + line[value.end_col_offset:]
+            ).decode('utf-8')
         
         # Write updated settings
         with open(settings_file, 'w') as f:
-            f.write('\n'.join(updated_lines))
+            f.write(''.join(lines))
         
         print(f"✅ Settings updated in: {settings_file}")
         return True
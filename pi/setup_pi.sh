@@ -24,7 +24,7 @@ sudo apt-get install -y \
     libgtk-3-dev \
     python3-opencv
 
-# Install GPIO library (system package is more reliable)
+# Install GPIO library (system package is more reliable; used by test/pir_test.py)
 echo "📡 Installing GPIO support..."
 sudo apt-get install -y python3-rpi.gpio
 
@@ -56,6 +56,10 @@ if ! pip install face-recognition>=1.3.0; then
     pip install face-recognition>=1.3.0
 fi
 
+# Install libgpiod v2 bindings (edge-triggered PIR events)
+echo "📡 Installing libgpiod bindings..."
+pip install "gpiod>=2.0"
+
 # Install ultralytics (YOLO)
 echo "🎯 Installing YOLO (ultralytics)..."
 pip install ultralytics>=8.0.0
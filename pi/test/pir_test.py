@@ -1,16 +1,22 @@
-import RPi.GPIO as GPIO
 import time
+from datetime import timedelta
+import gpiod
+from gpiod.line import Bias, Direction, Edge, Value
 
-PIR_GPIO = 11
-
-GPIO.setmode(GPIO.BOARD)
-GPIO.setup(PIR_GPIO, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-
-while True:
-    if GPIO.input(PIR_GPIO):
-        print('High')
-        
-    else:
-        print('Low')
-    time.sleep(0.5)
+PIR_CHIP = "/dev/gpiochip0"
+PIR_LINE = 17  # BCM line of physical pin 11
 
+# Print only transitions, timestamped by the kernel, instead of polling the level
+with gpiod.request_lines(
+    PIR_CHIP,
+    consumer="pir-test",
+    config={PIR_LINE: gpiod.LineSettings(direction=Direction.INPUT, edge_detection=Edge.BOTH, bias=Bias.PULL_DOWN)}
+) as request:
+    print(f"{time.monotonic():.6f} {'High' if request.get_value(PIR_LINE) == Value.ACTIVE else 'Low'} (initial)")
+    
+    while True:
+        if not request.wait_edge_events(timedelta(seconds=60)):
+            continue
+        for event in request.read_edge_events():
+            level = 'High' if event.event_type == event.Type.RISING_EDGE else 'Low'
+            print(f"{event.timestamp_ns / 1e9:.6f} {level}")
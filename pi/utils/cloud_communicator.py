@@ -4,15 +4,22 @@ Handles communication between Pi and cloud infrastructure
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
 import queue
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, List
 import os
 import uuid
 
+# No whitespace in JSON form fields - they are only read by the cloud API
+_COMPACT_JSON = (',', ':')
+
 class CloudCommunicator:
     """Handles all communication with the cloud API"""
     
@@ -28,6 +35,50 @@ class CloudCommunicator:
         self.cloud_url = cloud_url.rstrip('/')
         self.device_id = device_id
         self.api_key = api_key
+        
+        # Request configuration
+        self.timeout = 30  # seconds
+        self.max_retries = 3
+        self.retry_delay = 5  # seconds
+        
+        # Upload queues - priority events are always drained first
+        self.priority_queue = queue.Queue(maxsize=16)
+        self.event_queue = queue.Queue(maxsize=64)
+        self.upload_workers = 2
+        self.batch_max_events = 8  # events drained per HTTP request during bursts
+        self.batch_upload = True  # cleared if the cloud has no batch endpoint
+        self.queue_threads = []
+        self._stop_event = threading.Event()  # set by stop(); also cuts retry waits short
+        self._sync_pool = None  # single background thread for async settings syncs
+        
+        # Shared keep-alive connection pool for all cloud requests; retries
+        # connection failures with backoff (POSTs are never replayed on read errors)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Authorization'] = f'Bearer {api_key}'
+        
+        # Settings cache - replaced (never mutated) on each sync and handed out
+        # as a read-only view; settings_version increments with every sync
+        self.cached_settings = MappingProxyType({})
+        self.settings_version = 0
+        self.last_settings_update = None
+        
+        # Statistics
+        self.stats = {
+            'events_sent': 0,
+            'events_failed': 0,
+            'settings_synced': 0,
+            'last_connection': None
+        }
+        self._stats_lock = threading.Lock()
+        
+        print(f"🌐 Cloud communicator initialized for device: {device_id}")
     
     @classmethod
     def from_config(cls, config):
@@ -53,49 +104,35 @@ class CloudCommunicator:
             raise ValueError("cloud_url and device_id are required")
         
         return cls(cloud_url, device_id, api_key)
-        
-        # Request configuration
-        self.timeout = 30  # seconds
-        self.max_retries = 3
-        self.retry_delay = 5  # seconds
-        
-        # Event queue for offline scenarios
-        self.event_queue = queue.Queue(maxsize=100)
-        self.queue_thread = None
-        self.is_running = False
-        
-        # Settings cache
-        self.cached_settings = {}
-        self.last_settings_update = None
-        
-        # Statistics
-        self.stats = {
-            'events_sent': 0,
-            'events_failed': 0,
-            'settings_synced': 0,
-            'last_connection': None
-        }
-        
-        print(f"🌐 Cloud communicator initialized for device: {device_id}")
     
     def start(self):
         """Start the cloud communication service"""
-        self.is_running = True
+        self._stop_event.clear()
         
-        # Start background queue processor
-        self.queue_thread = threading.Thread(target=self._process_event_queue, daemon=True)
-        self.queue_thread.start()
+        # Start background upload workers
+        self.queue_threads = []
+        for i in range(self.upload_workers):
+            thread = threading.Thread(target=self._process_event_queue, name=f"cloud-upload-{i}", daemon=True)
+            thread.start()
+            self.queue_threads.append(thread)
         
         # Initial settings sync
+        if self._sync_pool is None:
+            self._sync_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cloud-sync")
         self._sync_settings_async()
         
         print("🚀 Cloud communication service started")
     
     def stop(self):
         """Stop the cloud communication service"""
-        self.is_running = False
-        if self.queue_thread:
-            self.queue_thread.join(timeout=5)
+        self._stop_event.set()
+        for thread in self.queue_threads:
+            thread.join(timeout=5)
+        self.queue_threads = []
+        if self._sync_pool:
+            self._sync_pool.shutdown(wait=False, cancel_futures=True)
+            self._sync_pool = None
+        self.session.close()
         print("🛑 Cloud communication service stopped")
     
     def send_security_event(
@@ -107,10 +144,14 @@ class CloudCommunicator:
         dwelling_analysis: Dict,
         snapshot_path: str,
         video_path: Optional[str] = None,
-        priority: bool = False
+        priority: bool = False,
+        snapshot_bytes: Optional[bytes] = None
     ) -> bool:
         """
-        Send security event to cloud
+        Queue security event for upload to cloud (non-blocking)
+        
+        Files are only opened by the upload workers, so this returns
+        immediately and never waits on the network.
         
         Args:
             event_type: Type of event (person_detected, motion, dwelling_alert, etc.)
@@ -121,81 +162,106 @@ class CloudCommunicator:
             snapshot_path: Path to snapshot image
             video_path: Path to video file (optional)
             priority: Whether this is a high-priority event
+            snapshot_bytes: Already-encoded JPEG bytes (skips re-reading snapshot_path)
             
         Returns:
-            bool: True if sent successfully, False if queued for retry
+            bool: True if queued for upload, False if dropped
         """
         event_data = {
             'event_type': event_type,
             'confidence_score': confidence_score,
-            'detected_objects': json.dumps(detected_objects),
-            'face_analysis': json.dumps(face_analysis),
-            'dwelling_analysis': json.dumps(dwelling_analysis),
-            'detected_at': datetime.now().isoformat(),
+            'detected_objects': json.dumps(detected_objects, separators=_COMPACT_JSON),
+            'face_analysis': json.dumps(face_analysis, separators=_COMPACT_JSON),
+            'dwelling_analysis': json.dumps(dwelling_analysis, separators=_COMPACT_JSON),
+            'detected_at': datetime.now().isoformat(timespec='milliseconds'),
             'device_id': self.device_id,
             'priority': priority
         }
         
+        if not snapshot_bytes and not (snapshot_path and os.path.exists(snapshot_path)):
+            print(f"⚠️  Snapshot file not found: {snapshot_path}")
+            return False
+        
+        event_item = {
+            'data': event_data,
+            'snapshot_path': snapshot_path,
+            'snapshot_bytes': snapshot_bytes,
+            'video_path': video_path,
+            'priority': priority,
+            'timestamp': time.time(),
+            'retries': 0
+        }
+        
+        if self._enqueue_event(event_item):
+            print(f"📤 Event queued for cloud: {event_type}")
+            return True
+        return False
+    
+    def _enqueue_event(self, event_item: Dict) -> bool:
+        """Put an event on the matching upload queue without blocking"""
+        if event_item['priority']:
+            try:
+                self.priority_queue.put_nowait(event_item)
+                return True
+            except queue.Full:
+                print("⚠️  Priority queue full, falling back to normal queue")
+        
+        try:
+            self.event_queue.put_nowait(event_item)
+            return True
+        except queue.Full:
+            print("❌ Event queue full, dropping event")
+            return False
+    
+    def _open_event_files(self, event_item: Dict) -> Dict:
+        """Build the multipart files dict for an event"""
         files = {}
         
         # Prepare image file
-        if snapshot_path and os.path.exists(snapshot_path):
-            files['image'] = ('snapshot.jpg', open(snapshot_path, 'rb'), 'image/jpeg')
+        if event_item['snapshot_bytes']:
+            files['image'] = ('snapshot.jpg', event_item['snapshot_bytes'], 'image/jpeg')
         else:
-            print(f"⚠️  Snapshot file not found: {snapshot_path}")
-            return False
+            files['image'] = ('snapshot.jpg', self._open_for_stream(event_item['snapshot_path']), 'image/jpeg')
         
         # Prepare video file if available
+        video_path = event_item['video_path']
         if video_path and os.path.exists(video_path):
-            files['video'] = ('video.mp4', open(video_path, 'rb'), 'video/mp4')
-        
-        try:
-            # Try to send immediately if high priority
-            if priority:
-                success = self._send_event_direct(event_data, files)
-                if success:
-                    print(f"✅ Priority event sent to cloud: {event_type}")
-                    return True
-            
-            # Queue for background processing
-            event_item = {
-                'data': event_data,
-                'files': files,
-                'timestamp': time.time(),
-                'retries': 0
-            }
-            
             try:
-                self.event_queue.put(event_item, timeout=1)
-                print(f"📤 Event queued for cloud: {event_type}")
-                return True
-            except queue.Full:
-                print("❌ Event queue full, dropping event")
+                files['video'] = ('video.mp4', self._open_for_stream(video_path), 'video/mp4')
+            except OSError:
                 self._close_files(files)
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error preparing event for cloud: {e}")
-            self._close_files(files)
-            return False
+                raise
+        
+        return files
+    
+    def _open_for_stream(self, path: str):
+        """Open a file that is read once, front to back, for upload"""
+        file_obj = open(path, 'rb')
+        if hasattr(os, 'posix_fadvise'):
+            # Larger kernel readahead for the sequential read
+            os.posix_fadvise(file_obj.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return file_obj
     
     def _send_event_direct(self, event_data: Dict, files: Dict) -> bool:
         """Send event directly to cloud API"""
         url = f"{self.cloud_url}/api/v1/events"
-        headers = {'Authorization': f'Bearer {self.api_key}'}
+        body, content_type = self._stream_multipart(event_data, files)
+        headers = {'Content-Type': content_type}
         
         try:
-            response = requests.post(
+            # Body is a generator, so requests sends it with chunked encoding
+            # instead of building the whole multipart payload in memory
+            response = self.session.post(
                 url,
-                data=event_data,
-                files=files,
+                data=body,
                 headers=headers,
                 timeout=self.timeout
             )
             
             if response.status_code == 200:
-                self.stats['events_sent'] += 1
-                self.stats['last_connection'] = datetime.now()
+                with self._stats_lock:
+                    self.stats['events_sent'] += 1
+                    self.stats['last_connection'] = datetime.now()
                 result = response.json()
                 print(f"✅ Event sent to cloud - ID: {result.get('event_id', 'unknown')}")
                 return True
@@ -212,37 +278,202 @@ class CloudCommunicator:
         finally:
             self._close_files(files)
     
+    def _send_events_batched(self, event_items: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Send several queued events in a single multipart request
+        
+        Returns:
+            List of events that failed and may be retried, or None if the
+            cloud has no batch endpoint (callers then send one at a time)
+        """
+        url = f"{self.cloud_url}/api/v1/events/batch"
+        fields = {}
+        files = {}
+        sent_items = []
+        
+        for event_item in event_items:
+            try:
+                event_files = self._open_event_files(event_item)
+            except OSError as e:
+                print(f"❌ Could not open event files, dropping event: {e}")
+                continue
+            
+            prefix = f"events[{len(sent_items)}]."
+            for name, value in event_item['data'].items():
+                fields[prefix + name] = value
+            for name, file_tuple in event_files.items():
+                files[prefix + name] = file_tuple
+            sent_items.append(event_item)
+        
+        if not sent_items:
+            return []
+        fields['count'] = len(sent_items)
+        
+        body, content_type = self._stream_multipart(fields, files)
+        headers = {'Content-Type': content_type}
+        
+        try:
+            # The cloud uploads every event's media before it responds, so allow
+            # each event the single-event timeout; a timeout mid-batch would
+            # retry (and duplicate) the events already created
+            response = self.session.post(url, data=body, headers=headers,
+                                         timeout=self.timeout * len(sent_items))
+            
+            if response.status_code in (404, 405):
+                print("ℹ️  Cloud has no batch upload endpoint, sending events individually")
+                self.batch_upload = False
+                return None
+            if response.status_code != 200:
+                print(f"❌ Cloud API error: {response.status_code} - {response.text}")
+                return sent_items
+            
+            failed = []
+            results = {result.get('index'): result for result in response.json().get('results', [])}
+            for index, event_item in enumerate(sent_items):
+                result = results.get(index)
+                if result and result.get('status') == 'created':
+                    print(f"✅ Event sent to cloud - ID: {result.get('event_id', 'unknown')}")
+                else:
+                    error = result.get('error') if result else 'no result'
+                    print(f"❌ Cloud rejected batched event {index}: {error}")
+                    failed.append(event_item)
+            
+            with self._stats_lock:
+                self.stats['events_sent'] += len(sent_items) - len(failed)
+                self.stats['last_connection'] = datetime.now()
+            return failed
+            
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Network error sending to cloud: {e}")
+            return sent_items
+        except Exception as e:
+            print(f"❌ Unexpected error sending to cloud: {e}")
+            return sent_items
+        finally:
+            self._close_files(files)
+    
+    def _stream_multipart(self, fields: Dict, files: Dict, chunk_size: int = 64 * 1024):
+        """
+        Build a streaming multipart/form-data body
+        
+        Args:
+            fields: Form fields (values are sent as strings)
+            files: name -> (filename, bytes or file object, content type)
+            chunk_size: Read size for file objects
+            
+        Returns:
+            tuple: (body generator, content type header)
+        """
+        boundary = uuid.uuid4().hex
+        
+        def body():
+            for name, value in fields.items():
+                yield (
+                    f'--{boundary}\r\n'
+                    f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                    f'{value}\r\n'
+                ).encode()
+            
+            for name, (filename, content, file_type) in files.items():
+                yield (
+                    f'--{boundary}\r\n'
+                    f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                    f'Content-Type: {file_type}\r\n\r\n'
+                ).encode()
+                
+                if isinstance(content, (bytes, bytearray, memoryview)):
+                    yield bytes(content)
+                else:
+                    # Stream file objects from disk in fixed-size chunks
+                    while True:
+                        chunk = content.read(chunk_size)
+                        if not chunk:
+                            break
+                        yield chunk
+                
+                yield b'\r\n'
+            
+            yield f'--{boundary}--\r\n'.encode()
+        
+        return body(), f'multipart/form-data; boundary={boundary}'
+    
+    def _next_event(self, timeout: float) -> Optional[Dict]:
+        """Get the next event to upload, draining priority events first"""
+        try:
+            return self.priority_queue.get_nowait()
+        except queue.Empty:
+            pass
+        
+        try:
+            return self.event_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def _drain_events(self, event_item: Dict) -> List[Dict]:
+        """Collect events already waiting behind event_item, up to the batch limit"""
+        event_items = [event_item]
+        for event_queue in (self.priority_queue, self.event_queue):
+            while len(event_items) < self.batch_max_events:
+                try:
+                    event_items.append(event_queue.get_nowait())
+                except queue.Empty:
+                    break
+        return event_items
+    
+    def _send_event(self, event_item: Dict) -> bool:
+        """Send a single queued event; returns False if it should be retried"""
+        try:
+            files = self._open_event_files(event_item)
+        except OSError as e:
+            print(f"❌ Could not open event files, dropping event: {e}")
+            return True
+        
+        success = self._send_event_direct(event_item['data'], files)
+        if success and event_item['priority']:
+            print(f"✅ Priority event sent to cloud: {event_item['data']['event_type']}")
+        return success
+    
+    def _retry_events(self, failed_items: List[Dict]):
+        """Requeue failed events that are still under the retry limit"""
+        retry_items = []
+        for event_item in failed_items:
+            event_item['retries'] += 1
+            if event_item['retries'] < self.max_retries:
+                retry_items.append(event_item)
+            else:
+                print(f"❌ Event failed after {self.max_retries} retries, dropping")
+                with self._stats_lock:
+                    self.stats['events_failed'] += 1
+        
+        if retry_items:
+            # Wait and requeue (returns early on shutdown; the queues are discarded anyway)
+            if self._stop_event.wait(self.retry_delay):
+                return
+            for event_item in retry_items:
+                if not self._enqueue_event(event_item):
+                    print("❌ Queue full during retry, dropping event")
+    
     def _process_event_queue(self):
-        """Background thread to process queued events"""
-        while self.is_running:
+        """Background worker to upload queued events"""
+        while not self._stop_event.is_set():
             try:
-                # Get event from queue
-                event_item = self.event_queue.get(timeout=1)
+                # Get event from queue; the timeout bounds how long a priority
+                # event can wait while this worker blocks on the normal queue
+                event_item = self._next_event(timeout=0.5)
+                if event_item is None:
+                    continue
                 
-                # Try to send
-                success = self._send_event_direct(event_item['data'], event_item['files'])
+                # During a burst, send everything already waiting in one request
+                event_items = self._drain_events(event_item) if self.batch_upload else [event_item]
                 
-                if not success:
-                    event_item['retries'] += 1
-                    
-                    # Retry if under limit
-                    if event_item['retries'] < self.max_retries:
-                        # Wait and requeue
-                        time.sleep(self.retry_delay)
-                        try:
-                            self.event_queue.put(event_item, timeout=1)
-                        except queue.Full:
-                            print("❌ Queue full during retry, dropping event")
-                            self._close_files(event_item['files'])
-                    else:
-                        print(f"❌ Event failed after {self.max_retries} retries, dropping")
-                        self.stats['events_failed'] += 1
-                        self._close_files(event_item['files'])
+                failed_items = None
+                if len(event_items) > 1:
+                    failed_items = self._send_events_batched(event_items)
+                if failed_items is None:
+                    failed_items = [item for item in event_items if not self._send_event(item)]
                 
-                self.event_queue.task_done()
+                self._retry_events(failed_items)
                 
-            except queue.Empty:
-                continue
             except Exception as e:
                 print(f"❌ Error in event queue processor: {e}")
     
@@ -254,17 +485,17 @@ class CloudCommunicator:
             Dict: Settings data or None if failed
         """
         url = f"{self.cloud_url}/api/v1/devices/{self.device_id}/settings"
-        headers = {'Authorization': f'Bearer {self.api_key}'}
-        
         try:
-            response = requests.get(url, headers=headers, timeout=self.timeout)
+            response = self.session.get(url, timeout=self.timeout)
             
             if response.status_code == 200:
                 settings = response.json()
-                self.cached_settings = settings
+                self.cached_settings = MappingProxyType(settings)
+                self.settings_version += 1
                 self.last_settings_update = datetime.now()
-                self.stats['settings_synced'] += 1
-                self.stats['last_connection'] = datetime.now()
+                with self._stats_lock:
+                    self.stats['settings_synced'] += 1
+                    self.stats['last_connection'] = self.last_settings_update
                 
                 print(f"✅ Settings synced from cloud")
                 return settings
@@ -281,29 +512,28 @@ class CloudCommunicator:
     
     def _sync_settings_async(self):
         """Asynchronously sync settings in background"""
-        def sync_worker():
-            self.sync_settings()
-        
-        thread = threading.Thread(target=sync_worker, daemon=True)
-        thread.start()
+        # Calls queue on the one sync thread instead of each spawning a thread
+        self._sync_pool.submit(self.sync_settings)
     
-    def get_cached_settings(self) -> Dict:
-        """Get last cached settings"""
-        return self.cached_settings.copy()
+    def get_cached_settings(self) -> Mapping[str, Any]:
+        """Get last cached settings (read-only; use dict() for a mutable copy)"""
+        return self.cached_settings
     
     def _close_files(self, files: Dict):
         """Close file handles"""
         for file_obj in files.values():
-            if hasattr(file_obj, 'close'):
-                try:
-                    file_obj.close()
-                except Exception as e:
-                    print(f"❌ Error closing file object: {e}")
-            elif isinstance(file_obj, tuple) and len(file_obj) > 1:
-                try:
-                    file_obj[1].close()  # Close the file handle in tuple
-                except Exception as e:
-                    print(f"❌ Error closing file object in tuple: {e}")
+            if isinstance(file_obj, tuple) and len(file_obj) > 1:
+                file_obj = file_obj[1]  # File handle in (filename, file, type) tuple
+            if not hasattr(file_obj, 'close'):
+                continue
+            try:
+                if hasattr(os, 'posix_fadvise') and not file_obj.closed:
+                    # Uploaded media isn't read again; drop it from the page
+                    # cache instead of letting it push out model weights
+                    os.posix_fadvise(file_obj.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+                file_obj.close()
+            except Exception as e:
+                print(f"❌ Error closing file object: {e}")
     
     def get_stats(self) -> Dict:
         """Get communication statistics"""
@@ -313,7 +543,7 @@ class CloudCommunicator:
         """Test connection to cloud API"""
         url = f"{self.cloud_url}/health"
         try:
-            response = requests.get(url, timeout=5)
+            response = self.session.get(url, timeout=5)
             success = response.status_code == 200
             if success:
                 print("✅ Cloud connection test successful")
@@ -344,27 +574,27 @@ class CloudConfigurationManager:
         
         # Background sync thread
         self.sync_thread = None
-        self.is_running = False
+        self._stop_event = threading.Event()
         
         print("⚙️  Cloud configuration manager initialized")
     
     def start(self):
         """Start background settings sync"""
-        self.is_running = True
+        self._stop_event.clear()
         self.sync_thread = threading.Thread(target=self._sync_worker, daemon=True)
         self.sync_thread.start()
         print("🔄 Background settings sync started")
     
     def stop(self):
         """Stop background settings sync"""
-        self.is_running = False
+        self._stop_event.set()
         if self.sync_thread:
             self.sync_thread.join(timeout=5)
         print("🛑 Background settings sync stopped")
     
     def _sync_worker(self):
         """Background worker for periodic settings sync"""
-        while self.is_running:
+        while not self._stop_event.is_set():
             try:
                 # Sync settings from cloud
                 settings = self.cloud_comm.sync_settings()
@@ -372,15 +602,13 @@ class CloudConfigurationManager:
                 if settings:
                     self._apply_cloud_settings(settings)
                 
-                # Wait for next sync
-                for _ in range(self.sync_interval):
-                    if not self.is_running:
-                        break
-                    time.sleep(1)
+                # Wait for next sync; stop() wakes this immediately
+                if self._stop_event.wait(self.sync_interval):
+                    break
                     
             except Exception as e:
                 print(f"❌ Error in settings sync worker: {e}")
-                time.sleep(30)  # Wait before retrying
+                self._stop_event.wait(30)  # Wait before retrying
     
     def _apply_cloud_settings(self, settings: Dict):
         """Apply settings from cloud to local configuration"""
@@ -399,19 +627,21 @@ class CloudConfigurationManager:
             
             # Face embeddings (trusted users)
             if 'face_embeddings' in settings:
-                embeddings = settings['face_embeddings']
-                for face_data in embeddings:
+                # Collect every valid entry and queue them as one request, so the
+                # face handler rebuilds its matrix and saves to disk only once
+                names = []
+                embeddings = []
+                for face_data in settings['face_embeddings']:
                     name = face_data.get('name')
                     embedding = face_data.get('embedding')
                     
                     if name and embedding:
-                        # Add to face recognition system
-                        self.config_queue.add_trusted_person(
-                            name, 
-                            json.dumps(embedding).encode(),  # Convert to bytes
-                            priority=2
-                        )
-                        print(f"👤 Updated trusted face: {name}")
+                        names.append(name)
+                        embeddings.append(embedding)
+                
+                if names:
+                    self.config_queue.add_trusted_embeddings(names, embeddings, priority=2)
+                    print(f"👤 Updated trusted faces: {', '.join(names)}")
             
             print("✅ Cloud settings applied successfully")
             
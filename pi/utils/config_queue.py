@@ -4,37 +4,42 @@ Handles configuration updates while system is busy processing
 Acts like a REST API queue for POST requests
 """
 
-import queue
+import itertools
+import os
 import threading
 import time
-import json
+from collections import OrderedDict, deque
 from datetime import datetime
 from enum import Enum
 from dataclasses import dataclass
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+from config.settings import Settings
 
 class ConfigAction(Enum):
     """Configuration action types"""
     UPDATE_YOLO_CONFIG = "update_yolo_config"
     ADD_TRUSTED_FACE = "add_trusted_face"
+    ADD_TRUSTED_EMBEDDINGS = "add_trusted_embeddings"
     REMOVE_TRUSTED_FACE = "remove_trusted_face"
     UPDATE_DWELLING_CONFIG = "update_dwelling_config"
     UPDATE_CAMERA_CONFIG = "update_camera_config"
 
+# Face enrollment runs detection/encoding models; these get their own worker so a
+# quick threshold change never waits behind them
+SLOW_ACTIONS = frozenset({
+    ConfigAction.ADD_TRUSTED_FACE,
+    ConfigAction.ADD_TRUSTED_EMBEDDINGS,
+    ConfigAction.REMOVE_TRUSTED_FACE,
+})
+
 @dataclass
 class ConfigRequest:
     """Configuration request data structure"""
     action: ConfigAction
     data: Dict[str, Any]
     request_id: str
-    timestamp: str
+    timestamp: float  # time.time() when queued
     priority: int = 1  # 1=high, 2=medium, 3=low
-    
-    def __lt__(self, other):
-        """Make ConfigRequest comparable for priority queue"""
-        if isinstance(other, ConfigRequest):
-            return self.priority < other.priority
-        return NotImplemented
 
 class ConfigurationQueue:
     """Queue system for handling configuration updates"""
@@ -43,25 +48,51 @@ class ConfigurationQueue:
         """Initialize configuration queue"""
         self.security_system = security_system
         
-        # Configuration queue with priority
-        self.config_queue = queue.PriorityQueue(maxsize=50)
+        # Configuration queue: "fast" and "slow" lanes, each with one FIFO per
+        # priority level (1=high, 2=medium, 3=low) and its own worker thread
+        self.max_queue_size = 50
+        self._lanes = {lane: [deque() for _ in range(3)] for lane in ('fast', 'slow')}
+        self._queue_condition = threading.Condition()
         
         # Processing state
-        self.is_processing = False
-        self.processor_thread = None
-        self.request_counter = 0
+        self._busy_lanes = set()
+        self.processor_threads = []
+        self._shutdown = threading.Event()
+        self._request_ids = itertools.count(1)  # next() is atomic, unlike += on a counter
         
-        # Results tracking
-        self.completed_requests = {}
-        self.failed_requests = {}
+        # Results tracking - oldest entries are evicted past max_tracked_results
+        self.max_tracked_results = 512
+        self.completed_requests = OrderedDict()
+        self.failed_requests = OrderedDict()
+        self.completed_count = 0  # lifetime totals; the dicts above only keep recent results
+        self.failed_count = 0
+        self._results_lock = threading.Lock()  # both lane workers record results
+        
+        # Action -> handler, looked up once per request
+        self._handlers = {
+            ConfigAction.UPDATE_YOLO_CONFIG: self._update_yolo_config,
+            ConfigAction.ADD_TRUSTED_FACE: self._add_trusted_face,
+            ConfigAction.ADD_TRUSTED_EMBEDDINGS: self._add_trusted_embeddings,
+            ConfigAction.REMOVE_TRUSTED_FACE: self._remove_trusted_face,
+            ConfigAction.UPDATE_DWELLING_CONFIG: self._update_dwelling_config,
+            ConfigAction.UPDATE_CAMERA_CONFIG: self._update_camera_config,
+        }
         
-        # Start processing thread
+        # Start processing threads
         self.start_processor()
     
+    @property
+    def is_processing(self):
+        """Whether any lane is executing a request"""
+        return bool(self._busy_lanes)
+    
     def start_processor(self):
-        """Start the configuration processor thread"""
-        self.processor_thread = threading.Thread(target=self._process_queue, daemon=True)
-        self.processor_thread.start()
+        """Start one configuration processor thread per lane"""
+        self.processor_threads = []
+        for lane in self._lanes:
+            thread = threading.Thread(target=self._process_queue, args=(lane,), name=f"config-{lane}", daemon=True)
+            thread.start()
+            self.processor_threads.append(thread)
         print("📋 Configuration queue processor started")
     
     def add_request(self, action: ConfigAction, data: Dict[str, Any], priority: int = 1) -> str:
@@ -76,35 +107,63 @@ class ConfigurationQueue:
         Returns:
             str: Request ID for tracking
         """
-        self.request_counter += 1
-        request_id = f"cfg_{self.request_counter}_{int(time.time())}"
+        request_id = f"cfg_{next(self._request_ids)}_{int(time.time())}"
         
         config_request = ConfigRequest(
             action=action,
             data=data,
             request_id=request_id,
-            timestamp=datetime.now().isoformat(),
+            timestamp=time.time(),
             priority=priority
         )
         
-        try:
-            # Add to priority queue (lower number = higher priority)
-            self.config_queue.put((priority, config_request), timeout=1)
-            print(f"📥 Config request queued: {action.value} (ID: {request_id})")
-            return request_id
-            
-        except queue.Full:
-            print(f"❌ Configuration queue full, request rejected: {action.value}")
-            return None
+        # Lower number = higher priority; out-of-range values go to the nearest level
+        priority_queues = self._lanes['slow' if action in SLOW_ACTIONS else 'fast']
+        level = min(max(priority, 1), len(priority_queues)) - 1
+        
+        with self._queue_condition:
+            if not self._queue_condition.wait_for(
+                lambda: self._queued_count() < self.max_queue_size, timeout=1
+            ):
+                print(f"❌ Configuration queue full, request rejected: {action.value}")
+                return None
+            
+            priority_queues[level].append(config_request)
+            self._queue_condition.notify_all()
+        
+        print(f"📥 Config request queued: {action.value} (ID: {request_id})")
+        return request_id
+    
+    def _queued_count(self) -> int:
+        """Number of queued requests across lanes (exact while holding _queue_condition)"""
+        return sum(len(requests) for priority_queues in self._lanes.values() for requests in priority_queues)
+    
+    def _next_request(self, lane: str) -> Optional[ConfigRequest]:
+        """Block until the lane has a request and pop its highest-priority one; None on shutdown"""
+        priority_queues = self._lanes[lane]
+        with self._queue_condition:
+            self._queue_condition.wait_for(
+                lambda: self._shutdown.is_set() or any(priority_queues)
+            )
+            if self._shutdown.is_set():
+                return None
+            
+            for requests in priority_queues:
+                if requests:
+                    # Wakes producers waiting for space
+                    self._queue_condition.notify_all()
+                    return requests.popleft()
     
-    def _process_queue(self):
-        """Process configuration requests from queue"""
-        while True:
+    def _process_queue(self, lane: str):
+        """Process configuration requests from one lane of the queue"""
+        while not self._shutdown.is_set():
             try:
-                # Get next request (blocks until available)
-                priority, config_request = self.config_queue.get(timeout=1)
+                # Get next request (blocks until add_request() or cleanup() notifies)
+                config_request = self._next_request(lane)
+                if config_request is None:
+                    break
                 
-                self.is_processing = True
+                self._busy_lanes.add(lane)
                 print(f"🔧 Processing config request: {config_request.action.value} (ID: {config_request.request_id})")
                 
                 # Process the request
@@ -112,34 +171,35 @@ class ConfigurationQueue:
                 
                 # Store result
                 if success:
-                    self.completed_requests[config_request.request_id] = {
-                        'action': config_request.action.value,
-                        'result': result,
-                        'timestamp': datetime.now().isoformat()
-                    }
+                    with self._results_lock:
+                        self.completed_count += 1
+                        self._record_result(self.completed_requests, config_request.request_id, {
+                            'action': config_request.action.value,
+                            'result': result,
+                            'timestamp': time.time()
+                        })
                     print(f"✅ Config request completed: {config_request.request_id}")
                 else:
-                    self.failed_requests[config_request.request_id] = {
-                        'action': config_request.action.value,
-                        'error': result,
-                        'timestamp': datetime.now().isoformat()
-                    }
+                    with self._results_lock:
+                        self.failed_count += 1
+                        self._record_result(self.failed_requests, config_request.request_id, {
+                            'action': config_request.action.value,
+                            'error': result,
+                            'timestamp': time.time()
+                        })
                     print(f"❌ Config request failed: {config_request.request_id} - {result}")
                 
-                # Mark task as done
-                self.config_queue.task_done()
-                self.is_processing = False
+                self._busy_lanes.discard(lane)
                 
-                # Small delay between requests
-                time.sleep(0.1)
-                
-            except queue.Empty:
-                # No requests to process
-                self.is_processing = False
-                continue
             except Exception as e:
                 print(f"❌ Config processor error: {e}")
-                self.is_processing = False
+                self._busy_lanes.discard(lane)
+    
+    def _record_result(self, results: OrderedDict, request_id: str, entry: Dict[str, Any]):
+        """Store a request result, dropping the oldest ones beyond the cap (caller holds _results_lock)"""
+        results[request_id] = entry
+        while len(results) > self.max_tracked_results:
+            results.popitem(last=False)
     
     def _execute_config_request(self, request: ConfigRequest) -> tuple[bool, str]:
         """
@@ -149,26 +209,11 @@ class ConfigurationQueue:
             tuple: (success, result_or_error_message)
         """
         try:
-            action = request.action
-            data = request.data
-            
-            if action == ConfigAction.UPDATE_YOLO_CONFIG:
-                return self._update_yolo_config(data)
+            handler = self._handlers.get(request.action)
+            if handler is None:
+                return False, f"Unknown action: {request.action.value}"
             
-            elif action == ConfigAction.ADD_TRUSTED_FACE:
-                return self._add_trusted_face(data)
-            
-            elif action == ConfigAction.REMOVE_TRUSTED_FACE:
-                return self._remove_trusted_face(data)
-            
-            elif action == ConfigAction.UPDATE_DWELLING_CONFIG:
-                return self._update_dwelling_config(data)
-            
-            elif action == ConfigAction.UPDATE_CAMERA_CONFIG:
-                return self._update_camera_config(data)
-            
-            else:
-                return False, f"Unknown action: {action.value}"
+            return handler(request.data)
                 
         except Exception as e:
             return False, f"Execution error: {str(e)}"
@@ -176,18 +221,21 @@ class ConfigurationQueue:
     def _update_yolo_config(self, data: Dict[str, Any]) -> tuple[bool, str]:
         """Update YOLO configuration"""
         try:
-            yolo_handler = self.security_system.yolo_handler if self.security_system else None
+            # Thresholds live on the behavior analyzer; don't touch the lazy
+            # yolo_handler property, which would load the model on this lane
+            behavior_analyzer = self.security_system.behavior_analyzer if self.security_system else None
+            
+            if not behavior_analyzer:
+                return False, "Behavior analyzer not available"
             
-            if not yolo_handler:
-                return False, "YOLO handler not available"
+            result = "YOLO config unchanged"
             
             # Update confidence threshold
             if 'min_confidence' in data:
                 new_confidence = float(data['min_confidence'])
                 if 0.0 <= new_confidence <= 1.0:
                     # Update in behavior analyzer
-                    if self.security_system.behavior_analyzer:
-                        self.security_system.behavior_analyzer.min_confidence = new_confidence
+                    behavior_analyzer.min_confidence = new_confidence
                     result = f"YOLO confidence updated to {new_confidence}"
                 else:
                     return False, "Confidence must be between 0.0 and 1.0"
@@ -197,12 +245,25 @@ class ConfigurationQueue:
                 model_path = data['model_path']
                 # This would require reloading the YOLO model
                 # For now, just validate the path
-                import os
                 if os.path.exists(model_path):
                     result = f"YOLO model path validated: {model_path} (restart required)"
                 else:
                     return False, f"Model file not found: {model_path}"
             
+            # Update number of sampled frames per YOLO call during video analysis
+            if 'batch_size' in data:
+                batch_size = int(data['batch_size'])
+                # Exported TensorRT engines only accept batches up to the size
+                # they were built with, and an existing engine is reused as-is
+                max_batch_size = Settings.get_yolo_export_config()['batch_size']
+                if batch_size <= 0:
+                    return False, "Batch size must be positive"
+                if batch_size > max_batch_size:
+                    return False, (f"Batch size must be at most {max_batch_size}; larger batches "
+                                   f"require raising YOLO_BATCH_SIZE and re-exporting the model")
+                behavior_analyzer.batch_size = batch_size
+                result = f"YOLO batch size updated to {batch_size}"
+            
             return True, result
             
         except Exception as e:
@@ -234,6 +295,28 @@ class ConfigurationQueue:
         except Exception as e:
             return False, f"Add trusted face failed: {str(e)}"
     
+    def _add_trusted_embeddings(self, data: Dict[str, Any]) -> tuple[bool, str]:
+        """Add a batch of precomputed trusted face embeddings"""
+        try:
+            face_handler = self.security_system.face_recognition if self.security_system else None
+            
+            if not face_handler:
+                return False, "Face recognition handler not available"
+            
+            # Required fields
+            if 'names' not in data or 'embeddings' not in data:
+                return False, "Missing required fields: names, embeddings"
+            
+            result = face_handler.store_face_embeddings(data['names'], data['embeddings'])
+            
+            if result['success']:
+                return True, f"Trusted embeddings added: {result['added']}"
+            else:
+                return False, f"Failed to add embeddings: {result['error']}"
+                
+        except Exception as e:
+            return False, f"Add trusted embeddings failed: {str(e)}"
+    
     def _remove_trusted_face(self, data: Dict[str, Any]) -> tuple[bool, str]:
         """Remove trusted face from face recognition system"""
         try:
@@ -247,35 +330,11 @@ class ConfigurationQueue:
             
             name = data['name']
             
-            # Load current faces
-            import os
-            import json
-            
-            if hasattr(face_handler, 'known_faces_file'):
-                faces_file = face_handler.known_faces_file
-                
-                if os.path.exists(faces_file):
-                    with open(faces_file, 'r') as f:
-                        known_faces = json.load(f)
-                    
-                    # Remove the face
-                    if name in known_faces:
-                        del known_faces[name]
-                        
-                        # Save updated faces
-                        with open(faces_file, 'w') as f:
-                            json.dump(known_faces, f, indent=2)
-                        
-                        # Reload in memory
-                        face_handler._load_known_faces()
-                        
-                        return True, f"Trusted face removed: {name}"
-                    else:
-                        return False, f"Face not found: {name}"
-                else:
-                    return False, "No trusted faces database found"
+            # Handler updates its in-memory faces and saves once
+            if face_handler.remove_face(name):
+                return True, f"Trusted face removed: {name}"
             else:
-                return False, "Face handler not properly configured"
+                return False, f"Face not found: {name}"
                 
         except Exception as e:
             return False, f"Remove trusted face failed: {str(e)}"
@@ -347,6 +406,14 @@ class ConfigurationQueue:
             priority
         )
     
+    def update_yolo_batch_size(self, batch_size: int, priority: int = 1) -> str:
+        """API method to update YOLO batch size"""
+        return self.add_request(
+            ConfigAction.UPDATE_YOLO_CONFIG,
+            {'batch_size': batch_size},
+            priority
+        )
+    
     def add_trusted_person(self, name: str, image_data: bytes, priority: int = 1) -> str:
         """API method to add trusted person"""
         return self.add_request(
@@ -355,6 +422,14 @@ class ConfigurationQueue:
             priority
         )
     
+    def add_trusted_embeddings(self, names: List[str], embeddings: List[List[float]], priority: int = 1) -> str:
+        """API method to add several trusted people from precomputed embeddings"""
+        return self.add_request(
+            ConfigAction.ADD_TRUSTED_EMBEDDINGS,
+            {'names': names, 'embeddings': embeddings},
+            priority
+        )
+    
     def remove_trusted_person(self, name: str, priority: int = 1) -> str:
         """API method to remove trusted person"""
         return self.add_request(
@@ -373,35 +448,50 @@ class ConfigurationQueue:
     
     def get_request_status(self, request_id: str) -> Dict[str, Any]:
         """Get status of a configuration request"""
-        if request_id in self.completed_requests:
+        # Lane workers evict from these maps, so read them under the same lock
+        with self._results_lock:
+            completed = self.completed_requests.get(request_id)
+            failed = self.failed_requests.get(request_id) if completed is None else None
+        
+        if completed is not None:
             return {
                 'status': 'completed',
-                'result': self.completed_requests[request_id]
+                'result': self._format_result(completed)
             }
-        elif request_id in self.failed_requests:
+        elif failed is not None:
             return {
                 'status': 'failed',
-                'error': self.failed_requests[request_id]
+                'error': self._format_result(failed)
             }
         else:
             return {
                 'status': 'pending_or_not_found'
             }
     
+    def _format_result(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a stored result with its timestamp as ISO text (only built when read)"""
+        return {**entry, 'timestamp': datetime.fromtimestamp(entry['timestamp']).isoformat()}
+    
     def get_queue_status(self) -> Dict[str, Any]:
         """Get current queue status"""
         return {
-            'queue_size': self.config_queue.qsize(),
+            'queue_size': self._queued_count(),
             'is_processing': self.is_processing,
-            'completed_requests': len(self.completed_requests),
-            'failed_requests': len(self.failed_requests)
+            'completed_requests': self.completed_count,
+            'failed_requests': self.failed_count
         }
     
     def cleanup(self):
         """Clean up the configuration queue"""
+        # Wake the processor if it is waiting for a request
+        with self._queue_condition:
+            self._shutdown.set()
+            self._queue_condition.notify_all()
+        
         # Wait for current processing to finish
         if self.is_processing:
             print("⏳ Waiting for current config request to finish...")
-            time.sleep(2)
+        for thread in self.processor_threads:
+            thread.join(timeout=2)
         
         print("🧹 Configuration queue cleaned up")
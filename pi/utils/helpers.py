@@ -1 +1,41 @@
+"""
+Shared helper utilities
+"""
 
+import threading
+import time
+from pathlib import Path
+
+# Directories already created by this process
+_created_dirs = set()
+
+# Second-granularity filename timestamp cache: [epoch_second, string, uses]
+_timestamp_cache = [None, None, 0]
+_timestamp_lock = threading.Lock()
+
+def ensure_directories(*directories):
+    """
+    Create directories if needed, touching the filesystem only the first
+    time each path is seen in this process
+    """
+    for directory in directories:
+        path = Path(directory)
+        if path in _created_dirs:
+            continue
+        path.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(path)
+
+def file_timestamp():
+    """
+    Local-time "%Y%m%d_%H%M%S" stamp for capture filenames
+    
+    strftime only runs once per second. Repeat calls within the same second
+    get a "_<n>" suffix so filenames stay unique under bursts.
+    """
+    second = int(time.time())
+    with _timestamp_lock:
+        if _timestamp_cache[0] != second:
+            _timestamp_cache[:] = [second, time.strftime("%Y%m%d_%H%M%S", time.localtime(second)), 0]
+            return _timestamp_cache[1]
+        _timestamp_cache[2] += 1
+        return f"{_timestamp_cache[1]}_{_timestamp_cache[2]}"
@@ -5,8 +5,15 @@ Handles logging and alerting for security events
 
 import os
 import json
-from datetime import datetime
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
 from config.settings import Settings
+from utils.helpers import ensure_directories
+
+logger = logging.getLogger(__name__)
 
 class SecurityLogger:
     """Handles security event logging and alerts"""
@@ -17,10 +24,19 @@ class SecurityLogger:
         self.log_dir = os.path.join(self.file_paths['captures'], 'logs')
         self.ensure_log_directory()
         
+        # Entries are written by one background thread that keeps the day's
+        # file open, so logging an event never waits on the SD card
+        self._write_queue = queue.Queue()
+        self._log_fd = None  # raw O_APPEND descriptor, no Python-level buffering
+        self._log_file_path = None
+        self._log_file_expires = 0.0  # time.time() of the next local midnight
+        self._writer_thread = threading.Thread(target=self._log_writer, name="security-log-writer", daemon=True)
+        self._writer_thread.start()
+        
     def ensure_log_directory(self):
         """Ensure log directory exists"""
         try:
-            os.makedirs(self.log_dir, exist_ok=True)
+            ensure_directories(self.log_dir)
         except Exception as e:
             print(f"Warning: Could not create log directory: {e}")
     
@@ -50,49 +66,106 @@ class SecurityLogger:
         return log_entry
     
     def _write_to_log_file(self, log_entry):
-        """Write log entry to file"""
-        try:
-            log_file = os.path.join(self.log_dir, f"security_{datetime.now().strftime('%Y%m%d')}.log")
-            with open(log_file, 'a') as f:
-                f.write(json.dumps(log_entry) + '\n')
-        except Exception as e:
-            print(f"Warning: Could not write to log file: {e}")
+        """Queue log entry for the writer thread"""
+        self._write_queue.put_nowait(log_entry)
+    
+    def _log_writer(self):
+        """Append queued entries to the day's log file, one write per drained batch"""
+        running = True
+        while running:
+            entries = [self._write_queue.get()]
+            # Everything already queued behind it goes out in the same write
+            while True:
+                try:
+                    entries.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            if None in entries:
+                running = False
+                entries = [entry for entry in entries if entry is not None]
+            if not entries:
+                continue
+            
+            try:
+                if self._log_fd is None or time.time() >= self._log_file_expires:
+                    # New day (or first entry) - switch files
+                    self._open_log_file()
+                
+                payload = ''.join(json.dumps(entry) + '\n' for entry in entries).encode()
+                self._write_all(payload)
+            except Exception as e:
+                print(f"Warning: Could not write to log file: {e}")
+        
+        self._close_log_file()
+    
+    def _write_all(self, payload):
+        """os.write until the whole payload is in the file (os.write retries EINTR itself)"""
+        view = memoryview(payload)
+        while view:
+            written = os.write(self._log_fd, view)
+            view = view[written:]
+    
+    def _open_log_file(self):
+        """Open today's log file and note when it has to be replaced"""
+        self._close_log_file()
+        now = datetime.now()
+        log_file = os.path.join(self.log_dir, f"security_{now.strftime('%Y%m%d')}.log")
+        self._log_fd = os.open(log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        self._log_file_path = log_file
+        
+        # Path only changes at local midnight; until then a float compare is enough
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        self._log_file_expires = midnight.timestamp()
+    
+    def _close_log_file(self):
+        """Close the current log file"""
+        if self._log_fd is not None:
+            try:
+                os.close(self._log_fd)
+            except Exception as e:
+                print(f"Warning: Could not close log file: {e}")
+            self._log_fd = None
+            self._log_file_path = None
+    
+    def close(self):
+        """Write out all queued entries and close the log file"""
+        if self._writer_thread.is_alive():
+            self._write_queue.put(None)
+            self._writer_thread.join(timeout=5)
     
     def _print_alert(self, log_entry):
-        """Print alert to console"""
+        """Print alert to console (formatted lazily by the log listener thread)"""
         severity = log_entry['severity']
         event_type = log_entry['event_type']
         timestamp = log_entry['timestamp']
         
         if severity == 'ALERT':
-            print(f"\n🚨 SECURITY ALERT 🚨")
-            print(f"Time: {timestamp}")
-            print(f"Event: {event_type}")
-            print(f"Details: {log_entry['details']}")
-            print("=" * 50)
+            logger.warning("\n🚨 SECURITY ALERT 🚨\nTime: %s\nEvent: %s\nDetails: %s\n%s",
+                           timestamp, event_type, log_entry['details'], "=" * 50)
         elif severity == 'WARNING':
-            print(f"\n⚠️  Security Warning: {event_type} at {timestamp}")
-            print(f"Details: {log_entry['details']}")
+            logger.warning("\n⚠️  Security Warning: %s at %s\nDetails: %s",
+                           event_type, timestamp, log_entry['details'])
         else:
-            print(f"ℹ️  Security Info: {event_type} at {timestamp}")
+            logger.info("ℹ️  Security Info: %s at %s", event_type, timestamp)
     
     def log_dwelling_event(self, dwelling_analysis, known_people, unknown_people):
         """Log dwelling detection event"""
         event_details = {
-            'dwelling_detected': dwelling_analysis['dwelling_detected'],
-            'confidence': dwelling_analysis['confidence'],
-            'duration': dwelling_analysis.get('longest_continuous_presence', 0),
-            'people_count': dwelling_analysis.get('average_people_count', 0),
+            'dwelling_detected': dwelling_analysis.dwelling_detected,
+            'confidence': dwelling_analysis.confidence,
+            'duration': dwelling_analysis.longest_continuous_presence,
+            'people_count': dwelling_analysis.average_people_count,
             'known_people': len(known_people),
             'unknown_people': len(unknown_people),
-            'message': dwelling_analysis['message']
+            'message': dwelling_analysis.message
         }
         
         # Determine severity
-        if dwelling_analysis['dwelling_detected'] and unknown_people:
+        if dwelling_analysis.dwelling_detected and unknown_people:
             severity = 'ALERT'
             event_type = 'unknown_person_dwelling'
-        elif dwelling_analysis['dwelling_detected']:
+        elif dwelling_analysis.dwelling_detected:
             severity = 'WARNING'
             event_type = 'known_person_dwelling'
         else:
@@ -104,10 +177,10 @@ class SecurityLogger:
     def log_face_recognition_event(self, face_analysis):
         """Log face recognition event"""
         event_details = {
-            'faces_detected': face_analysis.get('faces_detected', 0),
-            'recognized_faces': face_analysis.get('recognized_faces', []),
-            'unknown_faces': face_analysis.get('unknown_faces', 0),
-            'threat_level': face_analysis.get('threat_level', 'LOW')
+            'faces_detected': face_analysis.total_faces,
+            'recognized_faces': [f['person_name'] for f in face_analysis.faces if f['recognized']],
+            'unknown_faces': face_analysis.unknown_faces,
+            'threat_level': 'HIGH' if face_analysis.threat_detected else 'LOW'
         }
         
         severity = 'WARNING' if event_details['unknown_faces'] > 0 else 'INFO'
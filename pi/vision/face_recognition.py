@@ -3,13 +3,44 @@ Face Recognition Handler
 Compares detected faces against known face embeddings stored locally
 """
 
+import hashlib
 import json
 import os
+import pickle
+import shutil
+import time
 import numpy as np
 import cv2
 from datetime import datetime
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List
 import face_recognition  # pip install face-recognition
 from config.settings import Settings
+from utils.helpers import ensure_directories
+
+@dataclass(slots=True)
+class FaceResult:
+    """Result of analyzing a frame for known/unknown faces"""
+    threat_detected: bool = False
+    total_faces: int = 0
+    known_faces: int = 0
+    unknown_faces: int = 0
+    faces: List[Dict[str, Any]] = field(default_factory=list)
+    message: str = ''
+    
+    @property
+    def known_people(self):
+        """Face entries that matched a known person"""
+        return [face for face in self.faces if face['recognized']]
+    
+    @property
+    def unknown_people(self):
+        """Face entries that did not match anyone"""
+        return [face for face in self.faces if not face['recognized']]
+    
+    def to_dict(self):
+        """Convert to a plain dict (for JSON serialization)"""
+        return asdict(self)
 
 class FaceRecognitionHandler:
     """Handles face recognition using local embedding storage"""
@@ -17,13 +48,85 @@ class FaceRecognitionHandler:
     def __init__(self):
         """Initialize face recognition with local storage"""
         self.embeddings_file = Settings.get_face_embeddings_path()
+        self.embeddings_cache_file = Settings.get_face_embeddings_cache_path()
         self.face_images_dir = Settings.get_face_images_dir()
+        self.save_reference_images = Settings.get_face_save_reference_images()
         self.metadata_file = Settings.get_face_metadata_path()
+        self.max_embeddings_per_person = Settings.get_face_max_embeddings_per_person()
+        self.detection_max_size = Settings.get_face_detection_max_size()
+        # HOG on the CPU; the CNN detector is far too slow without a GPU
+        self.detection_kwargs = {
+            'model': 'hog',
+            'number_of_times_to_upsample': Settings.get_face_detection_upsample()
+        }
         
         # Load known faces from local storage
-        self.known_faces = self.load_known_faces()
+        self.known_faces = self._load_or_build_encoding_cache()
+        self._rebuild_known_matrix()
         print(f"Loaded {len(self.known_faces)} known faces")
         
+    def warmup(self, size=640):
+        """Run the face detector and encoder once on a blank frame"""
+        dummy = np.zeros((size, size, 3), dtype=np.uint8)
+        face_recognition.face_locations(dummy)
+        # Force the encoder to run on a fixed box since a blank frame has no faces
+        face_recognition.face_encodings(dummy, [(0, 150, 150, 0)])
+    
+    def _embeddings_file_key(self):
+        """(mtime_ns, sha1) of the embeddings JSON, used to validate the cache"""
+        with open(self.embeddings_file, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        return os.stat(self.embeddings_file).st_mtime_ns, digest
+    
+    def _load_or_build_encoding_cache(self):
+        """
+        Load known faces from the pickle cache, rebuilding it from JSON if stale
+        
+        Parsing thousands of floats out of the JSON file on every start is
+        slow on the Pi. The cache holds the already-converted numpy embeddings
+        and is keyed by the JSON file's mtime and SHA-1, so it is only rebuilt
+        when the JSON actually changes.
+        """
+        if not os.path.exists(self.embeddings_file):
+            return {}
+        
+        try:
+            mtime_ns, digest = self._embeddings_file_key()
+            with open(self.embeddings_cache_file, 'rb') as f:
+                cache = pickle.load(f)
+            if cache.get('source_sha1') == digest:
+                if cache.get('source_mtime_ns') != mtime_ns:
+                    # Touched but unchanged - refresh the key so the next start is a hit
+                    self._write_encoding_cache(cache['known_faces'])
+                return cache['known_faces']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Face embedding cache unusable, rebuilding: {e}")
+        
+        known_faces = self.load_known_faces()
+        self._write_encoding_cache(known_faces)
+        return known_faces
+    
+    def _write_encoding_cache(self, known_faces):
+        """Atomically write the pickle cache for the current embeddings JSON"""
+        try:
+            mtime_ns, digest = self._embeddings_file_key()
+            cache = {
+                'source_mtime_ns': mtime_ns,
+                'source_sha1': digest,
+                'known_faces': known_faces
+            }
+            
+            ensure_directories(os.path.dirname(self.embeddings_cache_file))
+            tmp_path = f"{self.embeddings_cache_file}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.embeddings_cache_file)
+            
+        except Exception as e:
+            print(f"Warning: Could not write face embedding cache: {e}")
+    
     def load_known_faces(self):
         """Load known face embeddings from local storage"""
         try:
@@ -41,6 +144,8 @@ class FaceRecognitionHandler:
                         'created_date': face_data.get('created_date'),
                         'last_seen': face_data.get('last_seen')
                     }
+                    if 'synced_digests' in face_data:
+                        known_faces[person_id]['synced_digests'] = set(face_data['synced_digests'])
                 return known_faces
             else:
                 return {}
@@ -56,65 +161,126 @@ class FaceRecognitionHandler:
             data = {}
             for person_id, face_data in self.known_faces.items():
                 embeddings_list = [emb.tolist() for emb in face_data['embeddings']]
+                last_seen = face_data.get('last_seen')
+                if isinstance(last_seen, float):
+                    # Kept as time.time() in memory; ISO format on disk
+                    last_seen = datetime.fromtimestamp(last_seen).isoformat()
                 data[person_id] = {
                     'name': face_data['name'],
                     'embeddings': embeddings_list,
                     'created_date': face_data.get('created_date'),
-                    'last_seen': face_data.get('last_seen')
+                    'last_seen': last_seen
                 }
+                if face_data.get('synced_digests'):
+                    data[person_id]['synced_digests'] = sorted(face_data['synced_digests'])
             
             # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(self.embeddings_file), exist_ok=True)
+            ensure_directories(os.path.dirname(self.embeddings_file))
             
-            # Save to file
-            with open(self.embeddings_file, 'w') as f:
+            # Save to file atomically so a power cut can't leave a truncated database
+            tmp_path = f"{self.embeddings_file}.tmp"
+            with open(tmp_path, 'w') as f:
                 json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.embeddings_file)
+            
+            self._write_encoding_cache(self.known_faces)
                 
             print(f"Saved {len(self.known_faces)} known faces to {self.embeddings_file}")
             
         except Exception as e:
             print(f"Error saving known faces: {e}")
     
-    def find_best_match(self, face_encoding, tolerance=0.6):
-        """Find the best matching known face"""
-        best_match = None
-        best_distance = float('inf')
+    def _rebuild_known_matrix(self):
+        """
+        Stack all known embeddings into one (N, 128) matrix for vectorized matching
         
+        Published as one (matrix, sq_norms, owners, names) tuple in a single
+        assignment, since the config queue rebuilds it while the event
+        pipeline is matching. Row i belongs to owners[i] / names[i]. Squared
+        row norms are precomputed so distances reduce to a single matrix product.
+        """
+        owners = []
+        names = []
+        embeddings = []
         for person_id, face_data in self.known_faces.items():
-            for known_encoding in face_data['embeddings']:
-                # Calculate face distance (lower = more similar)
-                distance = face_recognition.face_distance([known_encoding], face_encoding)[0]
-                
-                if distance < tolerance and distance < best_distance:
-                    best_distance = distance
-                    best_match = {
-                        'person_id': person_id,
-                        'name': face_data['name'],
-                        'confidence': 1.0 - distance,  # Convert distance to confidence
-                        'distance': distance
-                    }
+            for embedding in face_data['embeddings']:
+                owners.append(person_id)
+                names.append(face_data['name'])
+                embeddings.append(embedding)
+        
+        if embeddings:
+            matrix = np.vstack(embeddings).astype(np.float64)
+        else:
+            matrix = np.empty((0, 128), dtype=np.float64)
+        sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+        matrix.flags.writeable = False
+        sq_norms.flags.writeable = False
+        self._known_index = (matrix, sq_norms, tuple(owners), tuple(names))
+    
+    def _match_encodings(self, face_encodings, tolerance=0.6):
+        """
+        Find the best known match for each encoding in one BLAS call
+        
+        Uses ||k - p||^2 = ||k||^2 - 2 k.p + ||p||^2, giving the same
+        Euclidean distance as face_recognition.face_distance.
+        
+        Returns:
+            list: Best match dict (or None) for each encoding
+        """
+        # One snapshot for the whole match; never mixed with a concurrent rebuild
+        known_matrix, known_sq_norms, owners, names = self._known_index
+        if not len(face_encodings) or not owners:
+            return [None] * len(face_encodings)
+        
+        probes = np.asarray(face_encodings, dtype=np.float64)
+        sq_dist = (known_sq_norms[:, None]
+                   - 2.0 * (known_matrix @ probes.T)
+                   + np.einsum('ij,ij->i', probes, probes)[None, :])
+        # sqrt is monotonic, so rank on squared distances and only take the
+        # root of each probe's winner
+        best_rows = sq_dist.argmin(axis=0)
+        best_distances = np.sqrt(np.maximum(sq_dist[best_rows, np.arange(len(best_rows))], 0.0))
         
-        return best_match
+        matches = []
+        for row, distance in zip(best_rows, best_distances.tolist()):
+            if distance < tolerance:
+                matches.append({
+                    'person_id': owners[row],
+                    'name': names[row],
+                    'confidence': 1.0 - distance,  # Convert distance to confidence
+                    'distance': distance
+                })
+            else:
+                matches.append(None)
+        return matches
+    
+    def find_best_match(self, face_encoding, tolerance=0.6):
+        """Find the best matching known face"""
+        return self._match_encodings([face_encoding], tolerance)[0]
     
     def update_last_seen(self, person_id):
         """Update last seen timestamp for a person (in memory only)"""
-        if person_id in self.known_faces:
-            self.known_faces[person_id]['last_seen'] = datetime.now().isoformat()
+        face_data = self.known_faces.get(person_id)  # None if removed since the match
+        if face_data is not None:
+            # Plain timestamp per recognized face; formatted only when saved
+            face_data['last_seen'] = time.time()
             # Note: Not saving to disk - only persistent when new faces are added
     
-    def is_face_recognized(self, face_encoding, tolerance=0.6):
+    def is_face_recognized(self, face_encoding, tolerance=0.6, best_match=None):
         """
         Check if a single face encoding matches any known face
         
         Args:
             face_encoding: Face encoding array from face_recognition
             tolerance: Recognition tolerance (lower = stricter)
+            best_match: Precomputed result of find_best_match, if available
             
         Returns:
             dict: Recognition result with person info or None if unknown
         """
         try:
-            best_match = self.find_best_match(face_encoding, tolerance)
+            if best_match is None:
+                best_match = self.find_best_match(face_encoding, tolerance)
             
             if best_match:
                 # Update last seen
@@ -145,6 +311,52 @@ class FaceRecognitionHandler:
                 'distance': float('inf')
             }
     
+    def _locate_faces(self, frame):
+        """
+        Locate faces on a downscaled copy of the frame
+        
+        Detection cost scales with pixel count, so faces are located at
+        detection_max_size and the boxes are mapped back to full resolution.
+        Encodings are still computed from the full-resolution frame.
+        """
+        height, width = frame.shape[:2]
+        scale = self.detection_max_size / max(height, width)
+        if scale >= 1.0:
+            return face_recognition.face_locations(np.ascontiguousarray(frame), **self.detection_kwargs)
+        
+        small_frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        small_locations = face_recognition.face_locations(small_frame, **self.detection_kwargs)
+        
+        # Scale (top, right, bottom, left) back to the original frame
+        return [
+            (min(int(top / scale), height), min(int(right / scale), width),
+             min(int(bottom / scale), height), min(int(left / scale), width))
+            for top, right, bottom, left in small_locations
+        ]
+    
+    def _encode_faces(self, frame, face_locations):
+        """
+        Compute face encodings, accepting strided views (e.g. frame[:, :, ::-1])
+        
+        dlib needs contiguous memory, so for views only a tile around each
+        face is copied rather than the whole frame.
+        """
+        if frame.flags['C_CONTIGUOUS']:
+            return face_recognition.face_encodings(frame, face_locations)
+        
+        height, width = frame.shape[:2]
+        encodings = []
+        for top, right, bottom, left in face_locations:
+            # Margin keeps landmarks that fall slightly outside the box
+            margin = max(bottom - top, right - left) // 2
+            y0, y1 = max(top - margin, 0), min(bottom + margin, height)
+            x0, x1 = max(left - margin, 0), min(right + margin, width)
+            tile = np.ascontiguousarray(frame[y0:y1, x0:x1])
+            encodings.extend(face_recognition.face_encodings(
+                tile, [(top - y0, right - x0, bottom - y0, left - x0)]
+            ))
+        return encodings
+    
     def analyze_frame_for_threats(self, frame, tolerance=0.6):
         """
         Analyze camera frame for unknown faces (potential threats)
@@ -154,30 +366,26 @@ class FaceRecognitionHandler:
             tolerance: Recognition tolerance
             
         Returns:
-            dict: Analysis result with threat assessment
+            FaceResult: Analysis result with threat assessment
         """
         try:
             # Find all faces in frame
-            face_locations = face_recognition.face_locations(frame)
-            face_encodings = face_recognition.face_encodings(frame, face_locations)
+            face_locations = self._locate_faces(frame)
+            face_encodings = self._encode_faces(frame, face_locations)
             
             if not face_encodings:
-                return {
-                    'threat_detected': False,
-                    'total_faces': 0,
-                    'known_faces': 0,
-                    'unknown_faces': 0,
-                    'faces': [],
-                    'message': 'No faces detected'
-                }
+                return FaceResult(message='No faces detected')
             
             recognized_faces = []
             unknown_count = 0
             known_count = 0
             
+            # Match every face against every known embedding at once
+            best_matches = self._match_encodings(face_encodings, tolerance)
+            
             # Check each face
-            for i, (location, encoding) in enumerate(zip(face_locations, face_encodings)):
-                recognition_result = self.is_face_recognized(encoding, tolerance)
+            for i, (location, encoding, best_match) in enumerate(zip(face_locations, face_encodings, best_matches)):
+                recognition_result = self.is_face_recognized(encoding, tolerance, best_match)
                 
                 face_info = {
                     'face_id': i,
@@ -185,7 +393,9 @@ class FaceRecognitionHandler:
                     'recognized': recognition_result['recognized'],
                     'person_id': recognition_result['person_id'],
                     'person_name': recognition_result['person_name'],
-                    'confidence': recognition_result['confidence']
+                    'confidence': recognition_result['confidence'],
+                    # Match distance (lower = closer); None when unknown to keep JSON finite
+                    'distance': recognition_result['distance'] if recognition_result['recognized'] else None
                 }
                 
                 recognized_faces.append(face_info)
@@ -206,24 +416,148 @@ class FaceRecognitionHandler:
             else:
                 message = f"Safe: {known_count} known face(s) detected"
             
+            return FaceResult(
+                threat_detected=threat_detected,
+                total_faces=len(face_encodings),
+                known_faces=known_count,
+                unknown_faces=unknown_count,
+                faces=recognized_faces,
+                message=message
+            )
+            
+        except Exception as e:
+            print(f"Error analyzing frame for threats: {e}")
+            return FaceResult(
+                threat_detected=True,  # Assume threat on error for safety
+                message=f'Error analyzing frame: {e}'
+            )
+    
+    def _merge_closest_embeddings(self, embeddings):
+        """
+        Cap a person's embeddings at max_embeddings_per_person, in place
+        
+        The two closest embeddings are replaced by their mean, so repeated
+        enrollments refine the person's appearance clusters instead of
+        growing the matrix every frame is matched against.
+        """
+        while len(embeddings) > self.max_embeddings_per_person:
+            stack = np.vstack(embeddings)
+            sq_dist = ((stack[:, None, :] - stack[None, :, :]) ** 2).sum(axis=2)
+            np.fill_diagonal(sq_dist, np.inf)
+            i, j = np.unravel_index(sq_dist.argmin(), sq_dist.shape)
+            merged = (embeddings[i] + embeddings[j]) / 2.0
+            embeddings[:] = [emb for k, emb in enumerate(embeddings) if k not in (i, j)] + [merged]
+    
+    def remove_face(self, name):
+        """
+        Remove a known person by ID or name
+        
+        Returns:
+            int: Number of people removed (0 if nobody matched)
+        """
+        person_ids = [person_id for person_id, face_data in self.known_faces.items()
+                      if person_id == name or face_data['name'] == name]
+        
+        for person_id in person_ids:
+            del self.known_faces[person_id]
+        
+        # Updated in memory; written once
+        if person_ids:
+            self._rebuild_known_matrix()
+            self._save_known_faces()
+        
+        return len(person_ids)
+    
+    def _save_reference_image(self, person_id, image_data, image):
+        """Write a JPEG of an enrolled face next to the embeddings"""
+        try:
+            ensure_directories(self.face_images_dir)
+            # Embedding counts stop growing at the cap, so name by time instead
+            image_filename = f"{person_id}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jpg"
+            image_path = os.path.join(self.face_images_dir, image_filename)
+            
+            if isinstance(image_data, bytes):
+                # Already encoded - write the original bytes, no re-encode
+                with open(image_path, 'wb') as f:
+                    f.write(image_data)
+            elif isinstance(image_data, str) and image_data.lower().endswith(('.jpg', '.jpeg')):
+                # JPEG already on disk - copy it instead of re-encoding
+                shutil.copyfile(image_data, image_path)
+            elif len(image.shape) == 3 and image.shape[2] == 3:
+                # Convert RGB to BGR for OpenCV
+                cv2.imwrite(image_path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+            else:
+                cv2.imwrite(image_path, image)
+        except Exception as img_save_error:
+            print(f"Warning: Could not save reference image: {img_save_error}")
+    
+    def store_face_embeddings(self, names, embeddings):
+        """
+        Store precomputed face embeddings (e.g. synced from the cloud) in one batch
+        
+        Args:
+            names: Person name for each embedding
+            embeddings: One 128-d encoding per name (list of lists or (N, 128) array)
+            
+        Returns:
+            dict: Storage result with success status and number of embeddings added
+        """
+        try:
+            matrix = np.asarray(embeddings, dtype=np.float64)
+            if matrix.ndim != 2 or matrix.shape[1] != 128 or len(matrix) != len(names):
+                return {
+                    'success': False,
+                    'error': f'Expected {len(names)} embeddings of length 128, got shape {matrix.shape}',
+                    'added': 0
+                }
+            
+            added = 0
+            new_digests = 0
+            for name, embedding in zip(names, matrix):
+                # Stable ID per name so repeated syncs update the same person
+                person_id = 'cloud_' + name.lower().replace(' ', '_').replace('-', '_')
+                if person_id not in self.known_faces:
+                    self.known_faces[person_id] = {
+                        'name': name,
+                        'embeddings': [],
+                        'created_date': datetime.now().isoformat(),
+                        'last_seen': None
+                    }
+                
+                # Skip embeddings already synced. Digests are kept because
+                # merged rows no longer equal the embeddings they came from.
+                face_data = self.known_faces[person_id]
+                synced = face_data.setdefault('synced_digests', set())
+                digest = hashlib.sha1(embedding.tobytes()).hexdigest()
+                if digest in synced:
+                    continue
+                synced.add(digest)
+                new_digests += 1
+                existing = face_data['embeddings']
+                if any(np.allclose(embedding, known) for known in existing):
+                    continue
+                existing.append(embedding)
+                self._merge_closest_embeddings(existing)
+                added += 1
+            
+            # One matrix rebuild and one write for the whole batch
+            if added:
+                self._rebuild_known_matrix()
+            if new_digests:
+                self._save_known_faces()
+            
             return {
-                'threat_detected': threat_detected,
-                'total_faces': len(face_encodings),
-                'known_faces': known_count,
-                'unknown_faces': unknown_count,
-                'faces': recognized_faces,
-                'message': message
+                'success': True,
+                'added': added,
+                'message': f'Stored {added} new embeddings for {len(set(names))} people'
             }
             
         except Exception as e:
-            print(f"Error analyzing frame for threats: {e}")
+            print(f"Error storing face embeddings: {e}")
             return {
-                'threat_detected': True,  # Assume threat on error for safety
-                'total_faces': 0,
-                'known_faces': 0,
-                'unknown_faces': 0,
-                'faces': [],
-                'message': f'Error analyzing frame: {e}'
+                'success': False,
+                'error': str(e),
+                'added': 0
             }
     
     def store_face_from_image(self, image_data, person_name, person_id=None):
@@ -294,25 +628,11 @@ class FaceRecognitionHandler:
             self.known_faces[person_id]['embeddings'].append(face_encoding)
             
             # Save the face image to disk (optional - for reference)
-            try:
-                os.makedirs(self.face_images_dir, exist_ok=True)
-                image_filename = f"{person_id}_{len(self.known_faces[person_id]['embeddings'])}.jpg"
-                image_path = os.path.join(self.face_images_dir, image_filename)
-                
-                if isinstance(image_data, bytes):
-                    with open(image_path, 'wb') as f:
-                        f.write(image_data)
-                else:
-                    # Convert and save as JPEG using OpenCV
-                    if isinstance(image, np.ndarray):
-                        # Convert RGB to BGR for OpenCV if needed
-                        if len(image.shape) == 3 and image.shape[2] == 3:
-                            image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-                            cv2.imwrite(image_path, image_bgr)
-                        else:
-                            cv2.imwrite(image_path, image)
-            except Exception as img_save_error:
-                print(f"Warning: Could not save reference image: {img_save_error}")
+            if self.save_reference_images:
+                self._save_reference_image(person_id, image_data, image)
+            
+            self._merge_closest_embeddings(self.known_faces[person_id]['embeddings'])
+            self._rebuild_known_matrix()
             
             # Save embeddings to disk
             self._save_known_faces()
@@ -3,51 +3,173 @@ YOLO Object Detection Handler
 Handles YOLO result processing
 """
 
+import os
 import time
+import numpy as np
 from ultralytics import YOLO 
 from config.settings import Settings
 
+VEHICLE_CLASSES = frozenset({'car', 'truck', 'van', 'motorcycle'})
+
 class YOLOHandler:
     """Handles YOLO object detection results"""
     
     def __init__(self):
         """Initialize YOLO model"""
-        self.model = YOLO(Settings.get_yolo_model())
-        print(f"YOLO model loaded from {Settings.get_yolo_model()}")
+        self.model_path = self._resolve_model_path(Settings.get_yolo_model())
+        # Exported formats can't infer the task from the file, so state it
+        self.model = YOLO(self.model_path, task='detect')
+        print(f"YOLO model loaded from {self.model_path}")
+    
+    def _resolve_model_path(self, model_path):
+        """
+        Prefer an accelerated export next to the .pt weights, building it on
+        first run: a TensorRT FP16 engine when a CUDA device is available,
+        otherwise an ONNX model for onnxruntime on the CPU (optionally int8).
+        Falls back to the original weights if the export isn't possible.
+        """
+        export_config = Settings.get_yolo_export_config()
+        
+        # INT8 engines are built offline by inference/calibrate.py
+        if model_path.endswith('.int8.engine'):
+            if os.path.exists(model_path):
+                return model_path
+            print(f"INT8 engine {model_path} not found, falling back to FP16")
+            model_path = model_path[:-len('.int8.engine')] + '.pt'
+        
+        base, ext = os.path.splitext(model_path)
+        if ext != '.pt':
+            return model_path
+        
+        try:
+            import torch
+            has_cuda = torch.cuda.is_available()
+        except Exception:
+            has_cuda = False
+        
+        # Dynamic batch axis so process_frames() can send a whole batch at once
+        export_args = {
+            'imgsz': export_config['image_size'],
+            'dynamic': True,
+            'batch': export_config['batch_size']
+        }
+        
+        if has_cuda and export_config['tensorrt_fp16']:
+            return self._export_model(model_path, f"{base}.engine", "TensorRT FP16 engine",
+                                      format='engine', half=True, **export_args)
+        
+        if not has_cuda and export_config['onnx_cpu']:
+            onnx_path = self._export_model(model_path, f"{base}.onnx", "ONNX model",
+                                           format='onnx', simplify=True, **export_args)
+            if export_config['onnx_int8'] and onnx_path != model_path:
+                return self._quantize_onnx_int8(onnx_path)
+            return onnx_path
+        
+        return model_path
+    
+    def _export_model(self, model_path, export_path, description, **export_args):
+        """Export .pt weights with ultralytics unless export_path already exists"""
+        if os.path.exists(export_path):
+            return export_path
+        
+        try:
+            print(f"Building {description} from {model_path} (first run only)...")
+            return YOLO(model_path).export(**export_args)
+        except Exception as e:
+            print(f"{description} export failed, using {model_path}: {e}")
+            return model_path
+    
+    def _quantize_onnx_int8(self, onnx_path):
+        """Dynamically quantize ONNX weights to int8 (no calibration data needed)"""
+        int8_path = os.path.splitext(onnx_path)[0] + '.int8.onnx'
+        if os.path.exists(int8_path):
+            return int8_path
+        
+        try:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            
+            print(f"Quantizing {onnx_path} to int8 (first run only)...")
+            quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+            return int8_path
+        except Exception as e:
+            print(f"INT8 quantization failed, using {onnx_path}: {e}")
+            return onnx_path
+    
+    def warmup(self, size=640):
+        """Run a dummy inference so the first real frame doesn't pay model setup cost"""
+        dummy = np.zeros((size, size, 3), dtype=np.uint8)
+        self.model(dummy, verbose=False)
 
     def process_frame(self, frame):
         """Process a single frame for object detection"""
-        results = self.model(frame)
+        results = self.model(frame, verbose=False)
+        return self._build_result_info(results)
+    
+    def process_frames(self, frames):
+        """
+        Process a batch of frames in a single model call
         
+        Args:
+            frames: List of frames (numpy arrays)
+            
+        Returns:
+            list: One result_info dict per frame, in input order
+        """
+        if not frames:
+            return []
+        
+        # verbose=False: ultralytics otherwise formats and prints a log line per frame
+        results = self.model(frames, verbose=False)
+        return [self._build_result_info([result]) for result in results]
+    
+    def _build_result_info(self, results):
+        """Convert YOLO results for one frame into a result_info dict"""
         # Extract comprehensive detections
         detections = []
         for result in results:
-            for box in result.boxes:
-                # Get box coordinates in different formats
-                xyxy = box.xyxy.tolist()[0]  # [x1, y1, x2, y2]
-                xywh = box.xywh.tolist()[0]  # [center_x, center_y, width, height]
-                
-                detection = {
+            boxes = result.boxes
+            if not len(boxes):
+                continue
+            
+            # Convert each attribute for all boxes at once instead of per box
+            xyxy = boxes.xyxy.cpu().numpy()  # [x1, y1, x2, y2]
+            xywh = boxes.xywh.cpu().numpy()  # [center_x, center_y, width, height]
+            xyxyn = boxes.xyxyn.cpu().numpy()  # Normalized coordinates
+            class_ids = boxes.cls.cpu().numpy().astype(np.int64).tolist()
+            confidences = boxes.conf.cpu().numpy().tolist()
+            if boxes.id is not None:
+                track_ids = boxes.id.cpu().numpy().astype(np.int64).tolist()
+            else:
+                track_ids = [None] * len(class_ids)
+            
+            widths = xyxy[:, 2] - xyxy[:, 0]
+            heights = xyxy[:, 3] - xyxy[:, 1]
+            areas = widths * heights
+            
+            names = result.names
+            for bbox_xyxy, bbox_xywh, bbox_normalized, class_id, confidence, track_id, width, height, area in zip(
+                xyxy.tolist(), xywh.tolist(), xyxyn.tolist(), class_ids, confidences,
+                track_ids, widths.tolist(), heights.tolist(), areas.tolist()
+            ):
+                detections.append({
                     # Basic detection info
-                    'class_id': int(box.cls),
-                    'class_name': result.names[int(box.cls)],
-                    'confidence': float(box.conf),
+                    'class_id': class_id,
+                    'class_name': names[class_id],
+                    'confidence': confidence,
                     
                     # Bounding box in different formats
-                    'bbox_xyxy': xyxy,  # [x1, y1, x2, y2]
-                    'bbox_xywh': xywh,  # [center_x, center_y, width, height]
-                    'bbox_normalized': box.xyxyn.tolist()[0],  # Normalized coordinates
+                    'bbox_xyxy': bbox_xyxy,  # [x1, y1, x2, y2]
+                    'bbox_xywh': bbox_xywh,  # [center_x, center_y, width, height]
+                    'bbox_normalized': bbox_normalized,  # Normalized coordinates
                     
                     # Object size info
-                    'width': xyxy[2] - xyxy[0],
-                    'height': xyxy[3] - xyxy[1],
-                    'area': (xyxy[2] - xyxy[0]) * (xyxy[3] - xyxy[1]),
+                    'width': width,
+                    'height': height,
+                    'area': area,
                     
                     # Tracking ID (if available)
-                    'track_id': int(box.id) if box.id is not None else None,
-                }
-                
-                detections.append(detection)
+                    'track_id': track_id,
+                })
         
         # Add result metadata
         result_info = {
@@ -64,18 +186,21 @@ class YOLOHandler:
         """Get summary of detected objects"""
         detections = result_info['detections']
         
-        # Count objects by class
+        # Count objects by class and track the best confidence in one pass
         class_counts = {}
+        highest_confidence = 0
         for detection in detections:
             class_name = detection['class_name']
             class_counts[class_name] = class_counts.get(class_name, 0) + 1
+            if detection['confidence'] > highest_confidence:
+                highest_confidence = detection['confidence']
         
         return {
             'total_objects': len(detections),
             'class_counts': class_counts,
-            'has_person': any(d['class_name'] == 'person' for d in detections),
-            'has_vehicle': any(d['class_name'] in ['car', 'truck', 'van', 'motorcycle'] for d in detections),
-            'highest_confidence': max((d['confidence'] for d in detections), default=0),
+            'has_person': 'person' in class_counts,
+            'has_vehicle': not VEHICLE_CLASSES.isdisjoint(class_counts),
+            'highest_confidence': highest_confidence,
             'inference_time': result_info['inference_time']
         }
     